@@ -0,0 +1,328 @@
+"""
+Benchmarks for the ormlite hot paths.
+
+Usage:
+    python benchmarks/run.py                          # all benchmarks, at every size
+    python benchmarks/run.py --sizes 1000 --filter upsert
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare results.json   # flag regressions against a previous run
+
+Every benchmark runs twice: once for timing, and once under tracemalloc for peak memory,
+so the tracing overhead doesn't skew the timings.
+"""
+import argparse
+import dataclasses as dc
+import gc
+import json
+import platform
+import sqlite3
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from ormlite import model, field, select, upsert, migrate, connect_to_sqlite  # noqa: E402
+from ormlite import adapters  # noqa: E402
+from ormlite.orm import Context  # noqa: E402
+
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+WIDE_COLUMNS = 30
+
+
+@dc.dataclass
+class Benchmark:
+    """
+    :param name: Unique name, used to match results across runs
+    :param rows: Rows processed by one run, for computing throughput
+    :param setup: Builds the state for a run. Not timed
+    :param run: The timed part
+    """
+
+    name: str
+    rows: int
+    setup: Callable[[], Any]
+    run: Callable[[Any], Any]
+
+
+@dc.dataclass
+class Result:
+    name: str
+    rows: int
+    seconds: float
+    rows_per_sec: float
+    peak_bytes: int
+
+
+def reset_models():
+    Context.MODEL_TO_TABLE = dict()
+    Context.TABLE_TO_MODEL = dict()
+    Context.DECODERS = dict()
+
+
+def narrow_model() -> type:
+    @model("narrow")
+    class Narrow:
+        id: int = field(pk=True)
+        name: str
+        score: float
+
+    return Narrow
+
+
+def wide_model() -> type:
+    annotations: dict[str, Any] = {"id": int}
+    namespace: dict[str, Any] = {"id": field(pk=True)}
+    for i in range(WIDE_COLUMNS):
+        annotations[f"c{i}"] = str if i % 2 else int
+    namespace["__annotations__"] = annotations
+    return model("wide")(type("Wide", (), namespace))
+
+
+def adapted_model() -> type:
+    @model("adapted")
+    class Adapted:
+        id: int = field(pk=True)
+        created_at: datetime
+        updated_at: datetime
+        active: bool
+        deleted: bool
+
+    return Adapted
+
+
+def narrow_records(cls: type, n: int) -> Iterator[Any]:
+    return (cls(id=i, name=f"name {i}", score=i / 3) for i in range(n))
+
+
+def wide_records(cls: type, n: int) -> Iterator[Any]:
+    return (cls(i, *(f"v{j}" if j % 2 else j for j in range(WIDE_COLUMNS))) for i in range(n))
+
+
+def adapted_records(cls: type, n: int) -> Iterator[Any]:
+    start = datetime(2020, 1, 1)
+    return (
+        cls(id=i, created_at=start + timedelta(seconds=i), updated_at=start, active=i % 2 == 0, deleted=False)
+        for i in range(n)
+    )
+
+
+def populated(make_model: Callable[[], type], make_records: Callable[[type, int], Iterator[Any]], n: int):
+    def setup():
+        reset_models()
+        cls = make_model()
+        db = connect_to_sqlite(":memory:")
+        migrate(db)
+        upsert(db, make_records(cls, n), update=[])
+        return db, cls
+
+    return setup
+
+
+def empty(make_model: Callable[[], type]):
+    def setup():
+        reset_models()
+        cls = make_model()
+        db = connect_to_sqlite(":memory:")
+        migrate(db)
+        return db, cls
+
+    return setup
+
+
+def joined(n: int):
+    def setup():
+        reset_models()
+
+        @model("customers")
+        class Customer:
+            id: int = field(pk=True)
+            name: str
+
+        @model("orders")
+        class Order:
+            id: int = field(pk=True)
+            customer_id: int = field(fk="customers.id")
+            total: float
+
+        db = connect_to_sqlite(":memory:")
+        migrate(db)
+        customers = max(n // 10, 1)
+        upsert(db, (Customer(id=i, name=f"c{i}") for i in range(customers)), update=[])
+        upsert(db, (Order(id=i, customer_id=i % customers, total=float(i)) for i in range(n)), update=[])
+        return db, Order, Customer
+
+    return setup
+
+
+def many_tables(n: int):
+    def setup():
+        reset_models()
+        for i in range(n):
+            namespace = {
+                "__annotations__": {"id": int, "name": str, "created_at": datetime},
+                "id": field(pk=True),
+            }
+            model(f"table_{i}")(type(f"Table{i}", (), namespace))
+        return connect_to_sqlite(":memory:")
+
+    return setup
+
+
+def benchmarks(sizes: list[int]) -> Iterator[Benchmark]:
+    for n in sizes:
+        yield Benchmark(
+            f"upsert/narrow/{n}",
+            n,
+            empty(narrow_model),
+            lambda state, n=n: upsert(state[0], narrow_records(state[1], n), update=[]),
+        )
+        yield Benchmark(
+            f"upsert/wide/{n}",
+            n,
+            empty(wide_model),
+            lambda state, n=n: upsert(state[0], wide_records(state[1], n), update=[]),
+        )
+        yield Benchmark(
+            f"upsert/adapted/{n}",
+            n,
+            empty(adapted_model),
+            lambda state, n=n: upsert(state[0], adapted_records(state[1], n), update=[]),
+        )
+
+        for shape, make_model, make_records in [
+            ("narrow", narrow_model, narrow_records),
+            ("wide", wide_model, wide_records),
+            ("adapted", adapted_model, adapted_records),
+        ]:
+            setup = populated(make_model, make_records, n)
+            yield Benchmark(f"select/models/{shape}/{n}", n, setup, lambda state: select(state[1]).models(state[0]))
+            yield Benchmark(f"select/rows/{shape}/{n}", n, setup, lambda state: select(state[1]).rows(state[0]))
+            yield Benchmark(f"select/dicts/{shape}/{n}", n, setup, lambda state: select(state[1]).dicts(state[0]))
+            yield Benchmark(
+                f"select/iter_models/{shape}/{n}",
+                n,
+                setup,
+                lambda state: sum(1 for _ in select(state[1]).iter_models(state[0])),
+            )
+
+        yield Benchmark(
+            f"select/join/{n}",
+            n,
+            joined(n),
+            lambda state: select(state[1]).join(state[2]).extra("customers.name AS customer").rows(state[0]),
+        )
+
+        lookups = min(n, 10_000)
+        yield Benchmark(
+            f"select/where_pk/{n}",
+            lookups,
+            populated(narrow_model, narrow_records, n),
+            lambda state, lookups=lookups: [select(state[1]).where(id=i).models(state[0]) for i in range(lookups)],
+        )
+
+    for tables in [100, 500]:
+        yield Benchmark(f"migrate/create/{tables}", tables, many_tables(tables), migrate)
+
+        def migrated(tables: int = tables):
+            db = many_tables(tables)()
+            migrate(db)
+            return db
+
+        yield Benchmark(f"migrate/noop/{tables}", tables, migrated, migrate)
+
+
+def measure(benchmark: Benchmark) -> Result:
+    state = benchmark.setup()
+    gc.collect()
+    start = time.perf_counter()
+    benchmark.run(state)
+    seconds = time.perf_counter() - start
+    del state
+
+    state = benchmark.setup()
+    gc.collect()
+    tracemalloc.start()
+    benchmark.run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+
+    return Result(
+        name=benchmark.name,
+        rows=benchmark.rows,
+        seconds=seconds,
+        rows_per_sec=benchmark.rows / seconds if seconds else float("inf"),
+        peak_bytes=peak,
+    )
+
+
+def compare(results: list[Result], baseline_file: Path, threshold: float) -> bool:
+    """
+    Print the throughput ratio of each benchmark against the baseline.
+    :returns: Whether any benchmark regressed by more than the threshold
+    """
+    baseline = {result["name"]: result for result in json.loads(baseline_file.read_text())["results"]}
+    regressed = False
+    for result in results:
+        previous = baseline.get(result.name)
+        if previous is None:
+            continue
+        ratio = result.rows_per_sec / previous["rows_per_sec"]
+        flag = ""
+        if ratio < 1 - threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{result.name:<40} {ratio:6.2f}x{flag}")
+    return regressed
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="row counts to benchmark")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--native-adapters", action="store_true", help="use adapters.register(native=True)")
+    parser.add_argument("--output", type=Path, help="write results as json to this file")
+    parser.add_argument("--compare", type=Path, help="json results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="throughput drop that counts as a regression")
+    args = parser.parse_args(argv)
+
+    if args.native_adapters:
+        adapters.register(native=True)
+
+    results = []
+    for benchmark in benchmarks(args.sizes):
+        if args.filter not in benchmark.name:
+            continue
+        result = measure(benchmark)
+        results.append(result)
+        print(
+            f"{result.name:<40} {result.seconds:10.4f}s {result.rows_per_sec:14,.0f} rows/s "
+            f"{result.peak_bytes / 2**20:10.2f} MiB peak"
+        )
+
+    if args.output:
+        args.output.write_text(
+            json.dumps(
+                {
+                    "python": platform.python_version(),
+                    "sqlite": sqlite3.sqlite_version,
+                    "native_adapters": args.native_adapters,
+                    "results": [dc.asdict(result) for result in results],
+                },
+                indent=2,
+            )
+        )
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,27 @@
-from ormlite.query import select, upsert, Row
-from ormlite.orm import model, field, Context
-from ormlite.sqlite import connect_to_sqlite
-from ormlite.migrate import migrate
+from ormlite.query import select, upsert, upsert_async, Row
+from ormlite.orm import model, field, Index, Context
+from ormlite.sqlite import connect_to_sqlite, ConnectionPool
+from ormlite.migrate import migrate, plan_migration
+from ormlite.backfill import run_backfills
+from ormlite.aio import connect_async
+from ormlite.session import Session
 from ormlite import adapters
 
 __all__ = (
     "model",
     "field",
+    "Index",
     "select",
     "upsert",
+    "upsert_async",
     "migrate",
+    "plan_migration",
+    "run_backfills",
     "connect_to_sqlite",
+    "ConnectionPool",
+    "connect_async",
     "Row",
+    "Session",
 )
 
 adapters.register()
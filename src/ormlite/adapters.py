@@ -1,5 +1,5 @@
 import logging
-from datetime import datetime, date
+from datetime import datetime, date, timedelta, timezone
 
 from ormlite import orm
 from ormlite.orm import Adapter
@@ -7,10 +7,23 @@ from ormlite.orm import Adapter
 logger = logging.getLogger(__name__)
 
 
-def register():
-    orm.register_adapter(BoolAdapter())
-    orm.register_adapter(DateTimeAdapter())
-    orm.register_adapter(DateAdapter())
+def register(*, native: bool = False):
+    """
+    Register the adapters for bool, date and datetime.
+
+    :param native: Store these types as sqlite integers instead of text.
+        bools as 0/1, dates as julian day numbers, and datetimes as microseconds since the unix epoch.
+        Decoding these skips the intermediate string parsing, at the cost of human readable columns.
+
+    Converters for every adapter are registered regardless, so columns declared with either set still decode.
+    Individual fields can opt into a specific adapter with ``field(adapter=...)``.
+    """
+    text_adapters = [BoolAdapter(), DateTimeAdapter(), DateAdapter()]
+    native_adapters = [IntBoolAdapter(), EpochDateTimeAdapter(), JulianDateAdapter()]
+    for adapter in native_adapters if native else text_adapters:
+        orm.register_adapter(adapter)
+    for adapter in text_adapters if native else native_adapters:
+        orm.register_converter(adapter)
 
 
 class BoolAdapter(Adapter[bool]):
@@ -50,3 +63,60 @@ class DateTimeAdapter(Adapter[datetime]):
 
     def adapt(self, val: datetime) -> str:
         return val.isoformat()
+
+
+# The sql types below all contain "INT", so sqlite gives the columns integer affinity.
+# sqlite3 hands converters the value as bytes, which int() parses directly.
+
+
+class IntBoolAdapter(Adapter[bool]):
+    sql_type = "BOOLEAN_INT"
+    python_type = bool
+
+    def convert(self, b: bytes) -> bool:
+        if b == b"1":
+            return True
+        elif b == b"0":
+            return False
+        raise ValueError(f"invalid bool: {b!r}")
+
+    def adapt(self, val: bool) -> int:
+        return 1 if val else 0
+
+
+# Offset between python's proleptic gregorian ordinals and julian day numbers.
+# The result is compatible with sqlite's own date functions, e.g. date(2451545) = '2000-01-01'
+JULIAN_DAY_OFFSET = 1721425
+
+
+class JulianDateAdapter(Adapter[date]):
+    sql_type = "DATE_INT"
+    python_type = date
+
+    def convert(self, b: bytes) -> date:
+        return date.fromordinal(int(b) - JULIAN_DAY_OFFSET)
+
+    def adapt(self, val: date) -> int:
+        return val.toordinal() + JULIAN_DAY_OFFSET
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class EpochDateTimeAdapter(Adapter[datetime]):
+    """
+    Stores microseconds since the unix epoch.
+    Timezone aware datetimes are normalized to UTC, and always decode as naive datetimes.
+    """
+
+    sql_type = "TIMESTAMP_INT"
+    python_type = datetime
+
+    def convert(self, b: bytes) -> datetime:
+        return EPOCH + timedelta(microseconds=int(b))
+
+    def adapt(self, val: datetime) -> int:
+        if val.tzinfo is not None:
+            val = val.astimezone(timezone.utc).replace(tzinfo=None)
+        return (val - EPOCH) // MICROSECOND
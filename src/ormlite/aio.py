@@ -0,0 +1,119 @@
+from __future__ import annotations
+import asyncio
+import logging
+import queue
+import threading
+from typing import Any, Callable, Optional, TypeVar
+
+from ormlite.orm import DatabaseConnection
+from ormlite.sqlite import connect_to_sqlite, Settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_Request = tuple[Callable[[DatabaseConnection], Any], "asyncio.Future[Any]", asyncio.AbstractEventLoop]
+_Result = tuple["asyncio.Future[Any]", Any, Optional[BaseException]]
+
+
+class AsyncConnection:
+    """
+    Asyncio facade over a database connection.
+
+    The connection is opened on, and only ever used from, one dedicated worker thread.
+    Coroutines submit work to that thread and await the result, so long queries never block the event loop.
+
+    Requests queued while the worker is busy are drained and run back to back as one batch,
+    and their results are handed back to the event loop with a single wake up.
+    At most max_pending requests can be in flight, further callers wait for a free slot.
+    """
+
+    def __init__(self, connect: Callable[[], DatabaseConnection], *, max_pending: int = 64):
+        """
+        :param connect: Opens the connection. Called on the worker thread.
+        :param max_pending: Maximum number of requests queued or running at once
+        """
+        self._requests: queue.SimpleQueue[Optional[_Request]] = queue.SimpleQueue()
+        self._slots = asyncio.Semaphore(max_pending)
+        self._connect = connect
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, name="ormlite-aio", daemon=True)
+        self._thread.start()
+
+    async def run(self, fn: Callable[[DatabaseConnection], T]) -> T:
+        """
+        Run a blocking function against the connection, on the worker thread.
+        """
+        if self._closed:
+            raise RuntimeError("AsyncConnection is closed")
+
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            future: asyncio.Future[T] = loop.create_future()
+            self._requests.put((fn, future, loop))
+            return await future
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        await self.run(lambda db: db.close())
+        self._closed = True
+        self._requests.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+
+    async def __aenter__(self) -> AsyncConnection:
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.close()
+
+    def _work(self):
+        connect_error: Optional[BaseException] = None
+        try:
+            db = self._connect()
+        except BaseException as e:
+            db, connect_error = None, e
+
+        stopped = False
+        while not stopped:
+            batch = [self._requests.get()]
+            while not self._requests.empty():
+                batch.append(self._requests.get_nowait())
+
+            results: dict[asyncio.AbstractEventLoop, list[_Result]] = {}
+            for request in batch:
+                if request is None:
+                    stopped = True
+                    continue
+                fn, future, loop = request
+                try:
+                    if connect_error is not None:
+                        raise connect_error
+                    result, error = fn(db), None  # pyright: ignore
+                except BaseException as e:
+                    result, error = None, e
+                results.setdefault(loop, []).append((future, result, error))
+
+            for loop, resolved in results.items():
+                loop.call_soon_threadsafe(_resolve, resolved)
+
+
+def _resolve(resolved: list[_Result]):
+    for future, result, error in resolved:
+        if future.cancelled():
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+def connect_async(file_name: str, settings: Optional[Settings] = None, **kwargs: Any) -> AsyncConnection:
+    """
+    Open a sqlite database for use from asyncio.
+
+    :param file_name: Same as :func:`ormlite.connect_to_sqlite`
+    :param settings: Same as :func:`ormlite.connect_to_sqlite`
+    :param kwargs: Passed through to :class:`AsyncConnection`
+    """
+    return AsyncConnection(lambda: connect_to_sqlite(file_name, settings), **kwargs)
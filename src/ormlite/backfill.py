@@ -0,0 +1,151 @@
+"""
+Chunked backfills, for columns that migrate adds to existing tables.
+
+Declare how to fill in a column on its field, with ``field(backfill=...)``.
+When migrate adds the column, it queues a backfill in the ``_ormlite`` metadata table, without touching any rows.
+:func:`run_backfills` then works through the queue, updating rows in primary key order, one chunk per transaction.
+Other writers get the write lock between chunks,
+and the last finished key is saved with each chunk, so an interrupted backfill resumes where it stopped.
+"""
+import dataclasses as dc
+import logging
+import time
+from typing import Any, Optional
+
+from ormlite import orm, instrument, cache, schema
+from ormlite.orm import DatabaseConnection
+from ormlite.query import select
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Pending backfills are stored as "backfill:table.column" keys, with the last finished key as the value
+KEY_PREFIX = "backfill:"
+
+
+def metadata_key(table_name: str, column: str) -> str:
+    return f"{KEY_PREFIX}{table_name}.{column}"
+
+
+def queue_sql(table_name: str, column: str) -> str:
+    """
+    Statement that queues a backfill of the column, restarting it if one was already queued.
+    """
+    key = orm.to_sql_literal(metadata_key(table_name, column))
+    return (
+        f'INSERT INTO "{schema.METADATA_TABLE}" (key, value) VALUES ({key}, NULL) '
+        "ON CONFLICT DO UPDATE SET value = NULL"
+    )
+
+
+def pending_backfills(db: DatabaseConnection) -> list[tuple[str, str]]:
+    """
+    The queued backfills, as (table, column) pairs.
+    """
+    stored = schema.read_metadata_prefix(db, KEY_PREFIX)
+    return [tuple(key.removeprefix(KEY_PREFIX).split(".", 1)) for key in stored]  # pyright: ignore
+
+
+def run_backfills(db: DatabaseConnection, *, chunk_size: int = DEFAULT_CHUNK_SIZE, pause: float = 0.0) -> int:
+    """
+    Run every queued backfill to completion.
+    Safe to call again after an interruption, or concurrently from several processes.
+
+    :param chunk_size: Rows updated per transaction
+    :param pause: Seconds to sleep between chunks, to leave more room for other writers
+    :returns: The number of rows updated
+    """
+    return sum(
+        backfill_column(db, table_name, column, chunk_size=chunk_size, pause=pause)
+        for table_name, column in pending_backfills(db)
+    )
+
+
+def backfill_column(
+    db: DatabaseConnection,
+    table_name: str,
+    column: str,
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    pause: float = 0.0,
+) -> int:
+    key = metadata_key(table_name, column)
+    model = orm.models().get(table_name)
+    fields = {field.name: field for field in dc.fields(model)} if model else {}
+    field = fields.get(column)
+    if field is None or field.metadata.get("backfill") is None:
+        logger.warning(f"Dropping queued backfill of {table_name}.{column}, its field no longer declares one")
+        schema.delete_metadata(db, key)
+        return 0
+
+    updated = 0
+    while True:
+        instrument.execute(db, "BEGIN IMMEDIATE TRANSACTION")
+        try:
+            # read the progress within the transaction, so concurrent runners never repeat a chunk
+            stored = schema.read_metadata(db, key)
+            if key not in stored:
+                instrument.execute(db, "END TRANSACTION")
+                return updated
+
+            chunk = fill_chunk(db, model, field, stored[key], chunk_size)  # pyright: ignore
+            if chunk is None:
+                schema.delete_metadata(db, key)
+            else:
+                schema.write_metadata(db, {key: chunk[0]})
+        except BaseException:
+            instrument.execute(db, "ROLLBACK")
+            raise
+        instrument.execute(db, "END TRANSACTION")
+        cache.notify_write(table_name)
+
+        if chunk is None:
+            logger.info(f"Backfilled {table_name}.{column}: {updated} rows")
+            return updated
+        updated += chunk[1]
+        if pause:
+            time.sleep(pause)
+
+
+def fill_chunk(
+    db: DatabaseConnection, model: type, field: dc.Field[Any], after: Any, chunk_size: int
+) -> Optional[tuple[Any, int]]:
+    """
+    Fill in the next chunk of rows after the given key.
+
+    :returns: The last key of the chunk and the number of rows updated, or None when there are no rows left
+    """
+    table_name = orm.sql_table_name(model)
+    pk_field = orm.primary_key(model)
+    key = pk_field.name if pk_field else "rowid"
+    fill = field.metadata["backfill"]
+
+    if isinstance(fill, str):
+        after_sql = f'WHERE "{table_name}".{key} > ?' if after is not None else ""
+        (last,) = instrument.execute(
+            db,
+            f'SELECT MAX({key}) FROM (SELECT {key} FROM "{table_name}" {after_sql} ORDER BY {key} LIMIT {chunk_size})',
+            () if after is None else (after,),
+        ).fetchone()
+        if last is None:
+            return None
+
+        lower = f"{key} > ? AND " if after is not None else ""
+        cursor = instrument.execute(
+            db,
+            f'UPDATE "{table_name}" SET {field.name} = ({fill}) WHERE {lower}{key} <= ?',
+            (last,) if after is None else (after, last),
+        )
+        return last, cursor.rowcount
+
+    query = select(model).extra(f'"{table_name}".{key} AS _backfill_key').order_by(f'"{table_name}".{key}')
+    if after is not None:
+        query.where(f'"{table_name}".{key} > :after', after=after)
+    rows = query.limit(chunk_size).rows(db)
+    if not rows:
+        return None
+
+    values = [(orm.encode_value(field, fill(row.model)), row.extra["_backfill_key"]) for row in rows]
+    instrument.executemany(db, f'UPDATE "{table_name}" SET {field.name} = ? WHERE {key} = ?', values)
+    return rows[-1].extra["_backfill_key"], len(rows)
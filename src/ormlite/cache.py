@@ -0,0 +1,128 @@
+from __future__ import annotations
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Optional, TypeVar
+from collections.abc import Iterable, Hashable
+
+T = TypeVar("T")
+
+_CACHES: weakref.WeakSet[QueryCache] = weakref.WeakSet()
+
+
+class QueryCache:
+    """
+    In process cache of select query results.
+
+    Opt in per query with :meth:`ormlite.query.SelectQuery.cache`.
+    Results are keyed by the compiled sql, its parameters, the connection, and the kind of results requested.
+    A connection's results are dropped once it's garbage collected, when it supports weak references,
+    like the connections :func:`ormlite.connect_to_sqlite` opens.
+    Other connections are kept alive by their cached results until those are evicted.
+    Every write through the orm (upsert, migrate, and bulk updates and deletes) invalidates
+    the cached results of queries reading the written table, including through joins and prefetches.
+    Writes made with raw sql are not tracked, call :meth:`invalidate_table` after those.
+
+    Cached model instances are shared between callers, so treat them as read only.
+    """
+
+    def __init__(self, *, max_size: int = 256, ttl: Optional[float] = None):
+        """
+        :param max_size: Maximum number of cached results, the least recently used are evicted first
+        :param ttl: Seconds a result stays valid for, None to keep results until invalidated or evicted
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, frozenset[str], Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # connections are told apart by a token rather than id(), which is reused after they're collected
+        self._tokens: weakref.WeakKeyDictionary[Any, int] = weakref.WeakKeyDictionary()
+        self._next_token = itertools.count()
+        # tokens of collected connections, whose results are dropped on the next lookup.
+        # Finalizers can run in the middle of a locked section, so they only append here
+        self._collected: list[int] = []
+        _CACHES.add(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_load(self, db: Any, key: Hashable, tables: Iterable[str], load: Callable[[], T]) -> T:
+        """
+        :param db: The connection the results are loaded from
+        :param key: The results' key, within the connection
+        """
+        now = monotonic()
+        with self._lock:
+            self._drop_collected()
+            key = (self._connection_key(db), key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, _, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+            generation = self._generation
+
+        value = load()
+
+        expires = now + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            # skip storing results that a concurrent write may have made stale
+            if generation == self._generation:
+                self._entries[key] = (expires, frozenset(tables), value)
+                if len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def _connection_key(self, db: Any) -> Hashable:
+        try:
+            token = self._tokens.get(db)
+        except TypeError:
+            # not weakly referenceable, the key holds on to the connection instead
+            return db
+        if token is None:
+            token = self._tokens[db] = next(self._next_token)
+            weakref.finalize(db, _drop_connection, weakref.ref(self), token)
+        return token
+
+    def _drop_collected(self):
+        # called with the lock held
+        while self._collected:
+            token = self._collected.pop()
+            for key in [key for key in self._entries if key[0] == token]:  # pyright: ignore
+                del self._entries[key]
+
+    def invalidate_table(self, table: str):
+        with self._lock:
+            self._generation += 1
+            for key in [key for key, (_, tables, _) in self._entries.items() if table in tables]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+def _drop_connection(ref: weakref.ref[QueryCache], token: int):
+    # only weakly references the cache, so a cache isn't kept alive by the connections it has seen
+    cache = ref()
+    if cache is not None:
+        cache._collected.append(token)  # pyright: ignore[reportPrivateUsage]
+
+
+def notify_write(table: str):
+    """
+    Invalidate every cache's results that read from this table.
+    """
+    for cache in list(_CACHES):
+        cache.invalidate_table(table)
+
+
+def notify_schema_change():
+    for cache in list(_CACHES):
+        cache.clear()
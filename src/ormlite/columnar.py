@@ -0,0 +1,112 @@
+"""
+Columnar results, see :meth:`ormlite.query.SelectQuery.columns`.
+
+Numeric, bool and datetime columns are accumulated into typed ``array.array`` buffers batch by batch.
+When numpy is installed, the buffers are wrapped as numpy arrays at the end, otherwise they're returned as is.
+"""
+from __future__ import annotations
+import dataclasses as dc
+import math
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Optional
+from collections.abc import Iterable, Sequence
+
+from ormlite import orm
+from ormlite.adapters import EPOCH, MICROSECOND
+
+try:
+    import numpy as np  # pyright: ignore[reportMissingImports]
+except ImportError:
+    np = None
+
+
+@dc.dataclass(frozen=True)
+class ColumnKind:
+    """
+    :param typecode: array.array typecode of the buffer
+    :param dtype: numpy dtype the buffer is viewed as
+    :param raw: Select the stored value with ``+ 0``, which skips the sqlite3 converter for the declared type
+    """
+
+    typecode: str
+    dtype: str
+    raw: bool = False
+
+
+# Keyed by sql type, so every field mapped to one of these by Context.PYTHON_TO_SQL_MAPPING
+# or its own field(adapter=...) gets a typed column. Anything else is returned as a list.
+KINDS: dict[str, ColumnKind] = {
+    "INTEGER": ColumnKind("q", "int64"),
+    "REAL": ColumnKind("d", "float64"),
+    "BOOLEAN": ColumnKind("b", "bool", raw=True),
+    "BOOLEAN_INT": ColumnKind("b", "bool", raw=True),
+    "TIMESTAMP": ColumnKind("q", "datetime64[us]"),
+    "TIMESTAMP_INT": ColumnKind("q", "datetime64[us]", raw=True),
+}
+
+
+def column_kind(field: dc.Field[Any]) -> Optional[ColumnKind]:
+    return KINDS.get(orm.field_sql_type(field))
+
+
+def select_expression(table: str, field: dc.Field[Any]) -> str:
+    kind = column_kind(field)
+    if kind is not None and kind.raw:
+        return f'"{table}".{field.name} + 0 AS {field.name}'
+    return f'"{table}".{field.name}'
+
+
+class ColumnBuilder:
+    """
+    Accumulates the values of one column, one batch at a time.
+    """
+
+    def __init__(self, name: str, kind: Optional[ColumnKind]):
+        self.name = name
+        self.kind = kind
+        self.values: Any = [] if kind is None else array(kind.typecode)
+
+    def extend(self, values: Sequence[Any]):
+        kind = self.kind
+        if kind is None:
+            self.values.extend(values)
+        elif kind.dtype == "float64":
+            self.values.extend(math.nan if value is None else value for value in values)
+        elif None in values:
+            raise ValueError(f"{self.name} contains nulls, which a {kind.dtype} column can't hold")
+        elif kind.dtype == "datetime64[us]" and not kind.raw:
+            self.values.extend(map(_epoch_microseconds, values))
+        else:
+            self.values.extend(values)
+
+    def build(self) -> Any:
+        if np is None:
+            return self.values
+        if self.kind is None:
+            column = np.empty(len(self.values), dtype=object)
+            column[:] = self.values
+            return column
+        if not self.values:
+            return np.empty(0, dtype=self.kind.dtype)
+        return np.frombuffer(self.values, dtype=_buffer_dtype(self.kind)).view(self.kind.dtype)
+
+
+def build_columns(names: Sequence[str], kinds: Sequence[Optional[ColumnKind]], batches: Iterable[list[Any]]):
+    builders = [ColumnBuilder(name, kind) for name, kind in zip(names, kinds)]
+    for batch in batches:
+        if not batch:
+            continue
+        for builder, values in zip(builders, zip(*batch)):
+            builder.extend(values)
+    return {builder.name: builder.build() for builder in builders}
+
+
+def _epoch_microseconds(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // MICROSECOND
+
+
+def _buffer_dtype(kind: ColumnKind) -> str:
+    return {"q": "int64", "d": "float64", "b": "int8"}[kind.typecode]
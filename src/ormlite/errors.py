@@ -12,3 +12,15 @@ class InvalidForeignKeyError(Exception):
 
 class MultiplePrimaryKeysError(Exception):
     pass
+
+
+class InvalidJoinError(Exception):
+    pass
+
+
+class MissingPrimaryKeyError(Exception):
+    pass
+
+
+class UnsupportedTypeChangeError(Exception):
+    pass
@@ -0,0 +1,194 @@
+"""
+Instrumentation for the sql statements ormlite issues.
+
+Register a hook with :func:`add_hook` to receive a :class:`QueryEvent` after every statement.
+When no hooks are registered, statements run without any timing overhead.
+"""
+import logging
+import sqlite3
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any, Callable, Optional
+from collections.abc import Generator, Iterable
+
+from ormlite import orm
+from ormlite.orm import DatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryEvent:
+    """
+    :param sql: The sql statement
+    :param parameters: Parameters bound to the statement. None for executemany,
+        whose parameters are consumed by the time the event is emitted
+    :param elapsed: Seconds spent in sqlite, including fetching and decoding the results of a select
+    :param rows: Rows fetched by a select, or rows modified by any other statement.
+        -1 for statements run with :func:`execute` that return rows, since the caller fetches those afterwards
+    """
+
+    sql: str
+    parameters: Any
+    elapsed: float
+    rows: int
+
+
+@dataclass
+class PlanStep:
+    """
+    One row of ``EXPLAIN QUERY PLAN`` output.
+    """
+
+    id: int
+    parent: int
+    detail: str
+
+    @property
+    def full_scan_table(self) -> Optional[str]:
+        """
+        The table name, if this step scans the whole table without an index.
+        """
+        words = self.detail.split()
+        # sqlite before 3.36 writes "SCAN TABLE <table>" rather than "SCAN <table>"
+        if words[:2] == ["SCAN", "TABLE"]:
+            del words[1]
+        if len(words) >= 2 and words[0] == "SCAN" and "INDEX" not in words:
+            return words[1]
+        return None
+
+
+Hook = Callable[[QueryEvent], None]
+
+HOOKS: list[Hook] = []
+
+# Select queries are explained before running when this is set,
+# and a warning is logged for any full scan of a table with at least this many rows
+FULL_SCAN_WARNING_ROWS: Optional[int] = None
+
+
+def add_hook(hook: Hook):
+    HOOKS.append(hook)
+
+
+def remove_hook(hook: Hook):
+    HOOKS.remove(hook)
+
+
+def warn_on_full_scan(min_rows: Optional[int]):
+    """
+    Log a warning whenever a select query fully scans a table with at least min_rows rows.
+    This runs an extra EXPLAIN QUERY PLAN and COUNT per scanned table, so it is meant for diagnosing, not production.
+
+    :param min_rows: Pass None to switch the warnings off again
+    """
+    global FULL_SCAN_WARNING_ROWS
+    FULL_SCAN_WARNING_ROWS = min_rows
+
+
+def emit(event: QueryEvent):
+    for hook in HOOKS:
+        try:
+            hook(event)
+        except Exception:
+            logger.exception(f"instrumentation hook {hook} failed")
+
+
+def execute(db: DatabaseConnection, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:
+    if not HOOKS:
+        return db.execute(sql, parameters)
+
+    start = perf_counter()
+    cursor = db.execute(sql, parameters)
+    emit(QueryEvent(sql=sql, parameters=parameters, elapsed=perf_counter() - start, rows=cursor.rowcount))
+    return cursor
+
+
+def fetchall(db: DatabaseConnection, sql: str, parameters: Any = (), /) -> list[Any]:
+    """
+    Run a select and fetch all of its rows, reporting the rows fetched.
+    """
+    if not HOOKS:
+        return db.execute(sql, parameters).fetchall()
+
+    start = perf_counter()
+    rows = db.execute(sql, parameters).fetchall()
+    emit(QueryEvent(sql=sql, parameters=parameters, elapsed=perf_counter() - start, rows=len(rows)))
+    return rows
+
+
+def fetch_batches(
+    db: DatabaseConnection,
+    sql: str,
+    parameters: Any,
+    batch_size: int,
+    convert: Optional[Callable[[Any], Callable[[Any], Any]]] = None,
+    /,
+) -> tuple[sqlite3.Cursor, Generator[list[Any], None, None]]:
+    """
+    Run a select, and fetch its rows in batches.
+    The event is emitted once the batches run out or are closed, reporting the rows fetched.
+    Only time spent executing, fetching and converting counts as elapsed, not time the caller spends between batches.
+
+    :param convert: Builds the function applied to each row, from the cursor's description
+    :returns: The cursor, for its description, and the batches
+    """
+    if not HOOKS:
+        cursor = db.execute(sql, parameters)
+        fetch = lambda: cursor.fetchmany(batch_size)
+        if convert is not None:
+            convert_row = convert(cursor.description)
+            fetch = lambda: list(map(convert_row, cursor.fetchmany(batch_size)))
+        return cursor, (batch for batch in iter(fetch, []))
+
+    start = perf_counter()
+    cursor = db.execute(sql, parameters)
+    convert_row = convert(cursor.description) if convert is not None else None
+    elapsed = perf_counter() - start
+
+    def batches() -> Generator[list[Any], None, None]:
+        nonlocal elapsed
+        rows = 0
+        try:
+            while True:
+                start = perf_counter()
+                batch = cursor.fetchmany(batch_size)
+                if convert_row is not None:
+                    batch = list(map(convert_row, batch))
+                elapsed += perf_counter() - start
+                if not batch:
+                    break
+                rows += len(batch)
+                yield batch
+        finally:
+            emit(QueryEvent(sql=sql, parameters=parameters, elapsed=elapsed, rows=rows))
+
+    return cursor, batches()
+
+
+def executemany(db: DatabaseConnection, sql: str, parameters: Iterable[Any], /) -> sqlite3.Cursor:
+    if not HOOKS:
+        return db.executemany(sql, parameters)
+
+    start = perf_counter()
+    cursor = db.executemany(sql, parameters)
+    emit(QueryEvent(sql=sql, parameters=None, elapsed=perf_counter() - start, rows=cursor.rowcount))
+    return cursor
+
+
+def explain(db: DatabaseConnection, sql: str, parameters: Any = (), /) -> list[PlanStep]:
+    cursor = db.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+    return [PlanStep(id=row[0], parent=row[1], detail=row[3]) for row in cursor]
+
+
+def check_full_scans(db: DatabaseConnection, sql: str, parameters: Any = (), /):
+    if FULL_SCAN_WARNING_ROWS is None:
+        return
+
+    for step in explain(db, sql, parameters):
+        table = step.full_scan_table
+        if table not in orm.models():
+            continue
+        (count,) = db.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()
+        if count >= FULL_SCAN_WARNING_ROWS:
+            logger.warning(f"Full scan of {table} ({count} rows): {sql}")
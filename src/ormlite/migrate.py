@@ -1,15 +1,44 @@
-import re
+import hashlib
+import sqlite3
 import dataclasses as dc
 import logging
-from typing import Any, Callable
-from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any, Optional
 
-from ormlite import orm
-from ormlite.orm import column_def, DatabaseConnection
+from ormlite import orm, instrument, cache, schema, backfill
+from ormlite.orm import column_def, DatabaseConnection, Context
+from ormlite.errors import InvalidForeignKeyError, UnsupportedTypeChangeError
 
 
 logger = logging.getLogger(__name__)
 
+# Types sqlite converts between itself, through the new column's affinity, when a rebuild copies the rows
+PLAIN_TYPES = {"INTEGER", "REAL", "TEXT", "BLOB"}
+
+# sql expressions converting a column's stored values, when its type changes between an adapter's text
+# and integer encodings, see :mod:`ormlite.adapters`. Other type changes are rejected, rather than leaving
+# values the new type's converter can't parse
+TYPE_CONVERSIONS: dict[tuple[str, str], str] = {
+    ("BOOLEAN", "BOOLEAN_INT"): "{column}",
+    ("BOOLEAN_INT", "BOOLEAN"): "{column}",
+    # julian day numbers of the dates' noon, which is what JulianDateAdapter stores
+    ("DATE", "DATE_INT"): "CAST(julianday({column}) + 0.5 AS INTEGER)",
+    ("DATE_INT", "DATE"): "date({column})",
+    # isoformat only writes the fraction when there are microseconds, and then always all six digits.
+    # strftime rounds fractions to milliseconds, so it only gets the whole seconds, and any timezone suffix
+    ("TIMESTAMP", "TIMESTAMP_INT"): (
+        "CAST(strftime('%s', substr({column}, 1, 19)"
+        " || CASE WHEN substr({column}, 20, 1) = '.' THEN substr({column}, 27) ELSE substr({column}, 20) END)"
+        " AS INTEGER) * 1000000"
+        " + CASE WHEN substr({column}, 20, 1) = '.' THEN CAST(substr({column}, 21, 6) AS INTEGER) ELSE 0 END"
+    ),
+    ("TIMESTAMP_INT", "TIMESTAMP"): (
+        "strftime('%Y-%m-%dT%H:%M:%S', ({column} - (({column} % 1000000) + 1000000) % 1000000) / 1000000, 'unixepoch')"
+        " || CASE WHEN {column} % 1000000 != 0"
+        " THEN printf('.%06d', (({column} % 1000000) + 1000000) % 1000000) ELSE '' END"
+    ),
+}
+
 
 # ASSUMPTIONS:
 # - This only handles forward migrations, migrations are not reversible
@@ -17,9 +46,10 @@ logger = logging.getLogger(__name__)
 # - Done: drop columns
 # - Done: create tables
 # - Done: drop tables
+# - Done: create, drop and recreate indexes declared on models
+# - Done: change column types and constraints, by rebuilding the table:
+#   https://sqlite.org/lang_altertable.html#making_other_kinds_of_table_schema_changes
 # - Renaming columns or tables can be done with manual sql at the cli
-# changing constraints, is a tricky multi step process:
-# https://sqlite.org/lang_altertable.html#making_other_kinds_of_table_schema_changes
 def migrate(db: DatabaseConnection):
     """
     Warning: This will destructively delete your data. Don't use this if want to keep old tables data around even if there's no corresponding python model.
@@ -34,90 +64,463 @@ def migrate(db: DatabaseConnection):
         - Drops tables that don't correspond to any defined models
         - Adds new columns to existing tables
         - Drops old columns from existing tables
+        - Changes column types, constraints and foreign keys
+        - Creates, drops, or recreates indexes to match the model's declared indexes
+
+    Tables that only gain columns are altered in place.
+    Any other change to a table rebuilds it once, with all its changes at once:
+    its rows are copied into a new table in a single INSERT ... SELECT, which then replaces the old table.
+    Rowid tables keep their rowids. Values of columns changing between the text and integer encodings
+    of bools, dates and datetimes are converted, and other changes to or from those types are rejected.
+
+    Columns added to existing tables with ``field(backfill=...)`` are queued for :func:`ormlite.run_backfills`.
 
+    A fingerprint of the models, and sqlite's schema version, are stored in the ``_ormlite`` table after each migration.
+    While neither has changed, migrate returns straight away, without reading the schema.
+    """
+    fingerprint = schema_fingerprint()
+    if is_up_to_date(db, fingerprint):
+        return
+
+    # rebuilding a table drops it, which must not trigger foreign key actions on the tables referencing it.
+    # The pragma is a no-op inside a transaction, so it's switched off for the whole migration
+    (foreign_keys,) = instrument.execute(db, "PRAGMA foreign_keys").fetchone()
+    if foreign_keys:
+        instrument.execute(db, "PRAGMA foreign_keys = OFF")
+
+    try:
+        instrument.execute(db, """BEGIN EXCLUSIVE TRANSACTION""")
+        try:
+            schema.create_metadata_table(db)
+            apply_operations(db, operations(diff_schema(db)))
+            if foreign_keys:
+                check_foreign_keys(db)
+            schema.write_metadata(db, {"fingerprint": fingerprint, "schema_version": schema.schema_version(db)})
+        except BaseException:
+            instrument.execute(db, "ROLLBACK")
+            raise
+        instrument.execute(db, """END TRANSACTION""")
+    finally:
+        if foreign_keys:
+            instrument.execute(db, "PRAGMA foreign_keys = ON")
+    cache.notify_schema_change()
+
+
+@dataclass
+class TableDiff:
+    """
+    Changes that bring one existing table in line with its model.
+
+    :param add_columns: Column definitions to add, in model order
+    :param copy_columns: Columns in both the table and the model, whose data is kept
+    :param changed_columns: Columns whose type, nullability, default or primary key differ from the model.
+        These can't be changed in place
+    :param type_changes: The changed columns whose type differs, to their old and new types
+    :param copy_rowid: Whether the table keeps its rowids through a rebuild.
+        Keys of rowid tables are their rowids, e.g. in pagination tokens and backfill progress
+    :param foreign_keys_changed: Whether the foreign key constraints differ from the model
+    :param create_indexes: CREATE INDEX statements, for new or changed indexes
     """
-    db.execute("""BEGIN EXCLUSIVE TRANSACTION""")
-    cursor = db.execute(
+
+    table: str
+    add_columns: list[str] = dc.field(default_factory=list)
+    copy_columns: list[str] = dc.field(default_factory=list)
+    drop_columns: list[str] = dc.field(default_factory=list)
+    changed_columns: list[str] = dc.field(default_factory=list)
+    type_changes: dict[str, tuple[str, str]] = dc.field(default_factory=dict)
+    copy_rowid: bool = False
+    foreign_keys_changed: bool = False
+    drop_indexes: list[str] = dc.field(default_factory=list)
+    create_indexes: list[str] = dc.field(default_factory=list)
+
+    @property
+    def rebuild(self) -> bool:
+        """
+        Whether the table is rebuilt, rather than altered in place.
+        Dropping a column rewrites the whole table anyway, so drops rebuild too,
+        and then every other change to the table is done in the same pass.
         """
-        SELECT tbl_name, sql
-        FROM sqlite_schema
-        WHERE type = 'table'
-    """
-    ).fetchall()
-    sql_table_defs = {row[0]: row[1] for row in cursor}
-
-    # create new tables
-    for table_name, model in orm.models().items():
-        if table_name not in sql_table_defs:
-            create_table(db, model)
-
-    for table_name, sql in sql_table_defs.items():
-        # drop tables
-        if table_name not in orm.models():
-            drop_table(db, table_name)
+        return bool(self.drop_columns or self.changed_columns or self.foreign_keys_changed)
+
+    @property
+    def empty(self) -> bool:
+        return not (
+            self.add_columns
+            or self.drop_columns
+            or self.changed_columns
+            or self.foreign_keys_changed
+            or self.drop_indexes
+            or self.create_indexes
+        )
+
+
+@dataclass
+class SchemaDiff:
+    """
+    Everything migrate would change, to make the database match the models.
+
+    :param create_tables: Models without a table
+    :param drop_tables: Tables without a model
+    :param alter_tables: Existing tables that differ from their model
+    """
+
+    create_tables: list[type] = dc.field(default_factory=list)
+    drop_tables: list[str] = dc.field(default_factory=list)
+    alter_tables: list[TableDiff] = dc.field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.create_tables or self.drop_tables or self.alter_tables)
+
+
+def diff_schema(db: DatabaseConnection) -> SchemaDiff:
+    """
+    Compare the database's schema with the registered models.
+    """
+    existing = schema.read_schema(db)
+    models = orm.models()
+
+    diff = SchemaDiff(
+        create_tables=[model for table_name, model in models.items() if table_name not in existing],
+        drop_tables=[table_name for table_name in existing if table_name not in models],
+    )
+    for table_name, table in existing.items():
+        model = models.get(table_name)
+        if model is None:
+            continue
+        table_diff = diff_table(model, table)
+        if not table_diff.empty:
+            diff.alter_tables.append(table_diff)
+    return diff
+
+
+def diff_table(model: type, table: schema.TableSchema) -> TableDiff:
+    diff = TableDiff(table.name)
+    fields = dc.fields(model)
+
+    for field in fields:
+        column = table.columns.get(field.name)
+        if column is None:
+            diff.add_columns.append(column_def(field))
+            continue
+        diff.copy_columns.append(field.name)
+        expected = expected_column(field)
+        if column != expected:
+            diff.changed_columns.append(field.name)
+        if column.type.upper() != expected.type.upper():
+            diff.type_changes[field.name] = (column.type, expected.type)
+
+    field_names = {field.name for field in fields}
+    diff.drop_columns = [name for name in table.columns if name not in field_names]
+    diff.copy_rowid = not table.without_rowid and orm.primary_key(model) is None
+
+    # raw sql constraints may declare foreign keys of their own, which can't be told apart
+    if not getattr(model, "sql_constraints", None):
+        diff.foreign_keys_changed = table.foreign_keys != expected_foreign_keys(model)
+
+    declared_indexes = orm.indexes(model)
+    diff.drop_indexes = [name for name, sql in table.indexes.items() if declared_indexes.get(name) != sql]
+    diff.create_indexes = [sql for name, sql in declared_indexes.items() if table.indexes.get(name) != sql]
+    return diff
+
+
+def expected_column(field: dc.Field[Any]) -> schema.Column:
+    """
+    The column a field is created as, as ``PRAGMA table_xinfo`` reports it.
+    """
+    pk = bool(field.metadata.get("pk"))
+    return schema.Column(
+        name=field.name,
+        type=orm.field_sql_type(field),
+        # primary keys are always WITHOUT ROWID tables, which makes them not null
+        notnull=pk or not orm.is_nullable(field),
+        default=orm.column_default(field),
+        pk=1 if pk else 0,
+    )
+
+
+def expected_foreign_keys(model: type) -> frozenset[schema.ForeignKey]:
+    return frozenset(
+        schema.ForeignKey(
+            columns=(field.name,),
+            table=fk.table,
+            to=(fk.key or field.name,),
+            on_update="NO ACTION",
+            on_delete="NO ACTION",
+        )
+        for field in dc.fields(model)
+        for fk in [field.metadata.get("fk")]
+        if fk is not None
+    )
+
+
+@dataclass
+class Operation:
+    """
+    One step of a migration, see :func:`plan_migration`.
+
+    :param kind: One of create_table, drop_table, rebuild_table, add_column, create_index, drop_index or backfill.
+        A backfill step only queues the backfill, see :func:`ormlite.run_backfills`
+    :param table: The table the step changes
+    :param description: Human readable summary
+    :param statements: The sql the step runs
+    :param index: The index dropped by a drop_index step
+    :param rows: Rows in the table before the migration. Filled in by :func:`plan_migration`
+    :param pages: Estimated database pages the step reads or rewrites. Filled in by :func:`plan_migration`,
+        None when the estimate isn't available
+    """
+
+    kind: str
+    table: str
+    description: str
+    statements: list[str]
+    index: Optional[str] = None
+    rows: Optional[int] = None
+    pages: Optional[int] = None
+
+
+def operations(diff: SchemaDiff) -> list[Operation]:
+    """
+    The steps that carry out a diff, in the order migrate runs them.
+    """
+    steps: list[Operation] = []
+    for model in diff.create_tables:
+        name = orm.sql_table_name(model)
+        steps.append(Operation("create_table", name, f"Create table {name}", [create_table_sql(model)]))
+        steps.extend(create_index(name, index_sql) for index_sql in orm.indexes(model).values())
+
+    for table_name in diff.drop_tables:
+        steps.append(Operation("drop_table", table_name, f"Drop table {table_name}", [f'DROP TABLE "{table_name}"']))
+
+    for table in diff.alter_tables:
+        if table.rebuild:
+            model = orm.models()[table.table]
+            steps.append(rebuild_table(model, table))
+            # dropping the old table dropped its indexes too
+            steps.extend(create_index(table.table, index_sql) for index_sql in orm.indexes(model).values())
+            steps.extend(queue_backfills(model, table))
             continue
 
-        # migrate columns for existing tables
-        fields = dc.fields(orm.models()[table_name])
+        # drop stale indexes first, so they don't block dropping their columns
+        for index_name in table.drop_indexes:
+            steps.append(
+                Operation(
+                    "drop_index",
+                    table.table,
+                    f"Drop index {index_name}",
+                    [f'DROP INDEX "{index_name}"'],
+                    index=index_name,
+                )
+            )
+
+        for column in table.add_columns:
+            steps.append(
+                Operation(
+                    "add_column",
+                    table.table,
+                    f"Add column for {table.table}: {column}",
+                    [f'ALTER TABLE "{table.table}" ADD COLUMN {column}'],
+                )
+            )
+
+        steps.extend(create_index(table.table, index_sql) for index_sql in table.create_indexes)
+        steps.extend(queue_backfills(orm.models()[table.table], table))
+    return steps
+
+
+def create_index(table_name: str, index_sql: str) -> Operation:
+    return Operation("create_index", table_name, f"Create index: {index_sql}", [index_sql])
+
+
+def queue_backfills(model: type, diff: TableDiff) -> list[Operation]:
+    return [
+        Operation(
+            "backfill",
+            diff.table,
+            f"Queue backfill of {diff.table}.{field.name}",
+            [backfill.queue_sql(diff.table, field.name)],
+        )
+        for field in dc.fields(model)
+        if field.name not in diff.copy_columns and field.metadata.get("backfill") is not None
+    ]
 
-        field_names = {field.name for field in fields}
-        column_names = parse_column_names(sql)
 
-        fields_dict = {field.name: field for field in fields}
+def rebuild_table(model: type, diff: TableDiff) -> Operation:
+    """
+    Replace the table with a new one matching the model, copying the kept columns over in one pass.
+    """
+    name = orm.sql_table_name(model)
+    staging = f"{schema.METADATA_TABLE}_new_{name}"
+    columns = ["rowid"] if diff.copy_rowid and diff.copy_columns else []
+    columns += diff.copy_columns
+    values = [
+        convert_column(name, column, *diff.type_changes[column]) if column in diff.type_changes else column
+        for column in columns
+    ]
+
+    statements = [create_table_sql(model, name=staging)]
+    if diff.copy_columns:
+        statements.append(f'INSERT INTO "{staging}" ({",".join(columns)}) SELECT {",".join(values)} FROM "{name}"')
+    statements.append(f'DROP TABLE "{name}"')
+    statements.append(f'ALTER TABLE "{staging}" RENAME TO "{name}"')
+    types = {column: f"{old} -> {new}" for column, (old, new) in diff.type_changes.items()}
+    description = (
+        f"Rebuild table {name}, added: {diff.add_columns}, dropped: {diff.drop_columns}, "
+        f"changed: {diff.changed_columns}, types changed: {types}, foreign keys changed: {diff.foreign_keys_changed}"
+    )
+    return Operation("rebuild_table", name, description, statements)
 
-        new_fields = field_names - column_names
-        new_fields = sorted(new_fields, key=lambda x: index_of(fields, x))
 
-        for field_name in new_fields:
-            column = column_def(fields_dict[field_name])
-            logger.info(f"Add column for {table_name}: {column}")
-            db.execute(f"ALTER TABLE {table_name} ADD COLUMN {column}")
+def convert_column(table_name: str, column: str, old_type: str, new_type: str) -> str:
+    """
+    The sql expression copying a column's values over into its new type.
 
-        old_columns = column_names - field_names
-        for column_name in old_columns:
-            logger.info(f"Drop column for {table_name}: {column_name}")
-            db.execute(f"ALTER TABLE {table_name} DROP COLUMN {column_name}")
+    :raises UnsupportedTypeChangeError: When there's no known conversion between the types
+    """
+    old_type, new_type = old_type.upper(), new_type.upper()
+    if old_type in PLAIN_TYPES and new_type in PLAIN_TYPES:
+        return column
+    conversion = TYPE_CONVERSIONS.get((old_type, new_type))
+    if conversion is None:
+        raise UnsupportedTypeChangeError(
+            f"Can't convert {table_name}.{column} from {old_type} to {new_type}, "
+            "convert the column's values with manual sql first"
+        )
+    return f"{conversion.format(column=column)} AS {column}"
+
+
+def apply_operations(db: DatabaseConnection, steps: list[Operation]):
+    for step in steps:
+        for statement in step.statements:
+            instrument.execute(db, statement)
+        logger.info(step.description)
+
+
+def plan_migration(db: DatabaseConnection) -> list[Operation]:
+    """
+    Dry run of :func:`migrate`: the operations it would run, without changing anything.
+    The plan comes from the same diff migrate executes.
+
+    Each operation is annotated with the rows of the table it changes, and an estimate of the pages
+    it reads or rewrites, so expensive steps like table rebuilds and index builds on large tables stand out.
+    Row counts come from sqlite_stat1 when ANALYZE has been run, otherwise they're counted.
+    Page counts come from the dbstat virtual table, when sqlite was compiled with it.
+    """
+    steps = operations(diff_schema(db))
+    existing = {step.table for step in steps if step.kind != "create_table"}
+    created = {step.table for step in steps if step.kind == "create_table"}
+    rows = {table: count_rows(db, table) for table in existing - created}
+    indexes = {table: table_indexes(db, table) for table in existing - created}
+    touched = [*rows, *(index for names in indexes.values() for index in names)]
+    pages = btree_pages(db, touched)
+
+    for step in steps:
+        step.rows = rows.get(step.table, 0)
+        if pages is None:
+            continue
+        table_pages = pages.get(step.table, 0)
+        if step.kind == "add_column":
+            # only the schema changes, existing rows are left as is
+            step.pages = 0
+        elif step.kind == "drop_index" and step.index is not None:
+            step.pages = pages.get(step.index, 0)
+        elif step.kind in ("drop_table", "rebuild_table"):
+            step.pages = table_pages + sum(pages.get(index, 0) for index in indexes[step.table])
+        else:
+            # creating a table is free, an index build scans the whole table, and a backfill rewrites it
+            step.pages = table_pages
+    return steps
+
+
+def count_rows(db: DatabaseConnection, table_name: str) -> int:
+    try:
+        (estimate,) = instrument.execute(
+            db, "SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = ?", (table_name,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # no sqlite_stat1 until ANALYZE runs
+        estimate = None
+    if estimate is not None:
+        return estimate
+    (count,) = instrument.execute(db, f'SELECT COUNT(*) FROM "{table_name}"').fetchone()
+    return count
+
+
+def btree_pages(db: DatabaseConnection, names: list[str]) -> Optional[dict[str, int]]:
+    """
+    Pages used by each of these tables and indexes, or None if sqlite wasn't compiled with the dbstat virtual table.
+    Each is looked up by name, so dbstat only walks their btrees rather than the whole file.
+    """
+    pages: dict[str, int] = {}
+    for name in names:
+        try:
+            (count,) = instrument.execute(db, "SELECT COUNT(*) FROM dbstat WHERE name = ?", (name,)).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        pages[name] = count
+    return pages
 
-    db.execute("""END TRANSACTION""")
 
+def table_indexes(db: DatabaseConnection, table_name: str) -> list[str]:
+    cursor = instrument.execute(db, "SELECT name FROM pragma_index_list(?)", (table_name,))
+    return [name for (name,) in cursor]
 
-REGEX = re.compile(r'CREATE TABLE "?(?P<table_name>\w+)"?\s*\((?P<defs>[\s\w,\'\(\)]*)')
-IDENT = re.compile(r"[a-z]\w*")
 
+def check_foreign_keys(db: DatabaseConnection):
+    violations = instrument.execute(db, "PRAGMA foreign_key_check").fetchall()
+    if violations:
+        tables = sorted({table for table, *_ in violations})
+        raise InvalidForeignKeyError(f"Migrating left rows with broken foreign keys in: {', '.join(tables)}")
 
-def parse_column_names(raw_table_sql: str) -> set[str]:
-    match = REGEX.match(raw_table_sql)
-    if match is None:
-        raise Exception(f"regex failed to parse: {raw_table_sql}")
 
-    defs = match.group("defs").strip().split(",")
-    get_name: Callable[[str], str] = lambda row: re.split(r"\s+", row.strip())[0]
-    col_names = {
-        name for row in defs for name in [get_name(row)] if IDENT.fullmatch(name)
-    }
-    return col_names
+# Memoizes the last fingerprint computed, keyed by everything it depends on
+_fingerprint_cache: tuple[Any, str] = ((), "")
 
 
-def index_of(fields: Sequence[dc.Field[Any]], name: str) -> int:
-    return next(i for i, f in enumerate(fields) if f.name == name)
+def schema_fingerprint() -> str:
+    """
+    Hash of the schema the registered models declare.
+    """
+    global _fingerprint_cache
+    key = (tuple(Context.MODEL_TO_TABLE.items()), tuple(Context.PYTHON_TO_SQL_MAPPING.items()))
+    cached_key, fingerprint = _fingerprint_cache
+    if cached_key == key:
+        return fingerprint
+
+    digest = hashlib.sha256()
+    for _, model in sorted(orm.models().items()):
+        digest.update(create_table_sql(model).encode())
+        for index_sql in sorted(orm.indexes(model).values()):
+            digest.update(index_sql.encode())
+    fingerprint = digest.hexdigest()
+    _fingerprint_cache = (key, fingerprint)
+    return fingerprint
+
+
+def is_up_to_date(db: DatabaseConnection, fingerprint: Optional[str] = None) -> bool:
+    """
+    Whether the last migration ran with the same models, and the schema hasn't been changed since.
+    """
+    stored = schema.read_metadata(db, "fingerprint", "schema_version")
+    return (
+        stored.get("fingerprint") == (fingerprint or schema_fingerprint())
+        and stored.get("schema_version") == schema.schema_version(db)
+    )
 
 
-def create_table(db: DatabaseConnection, model: type):
+def create_table_sql(model: type, *, name: Optional[str] = None) -> str:
+    """
+    :param name: Table name to create, defaults to the model's
+    """
     defs = (column_def(field) for field in dc.fields(model))
     without_row_id = (
         "WITHOUT ROWID"
         if any(field.metadata.get("pk") for field in dc.fields(model))
         else ""
     )
-    name = orm.sql_table_name(model)
+    name = name or orm.sql_table_name(model)
     sql_constraints = getattr(model, "sql_constraints", [])
-
-    db.execute(
-        f"""
-        CREATE TABLE "{name}" ({", ".join([*defs, *fk_constraints(model), *sql_constraints])}) {without_row_id}
-        """
-    )
-    logger.info(f"Table created: {name}")
+    return f'CREATE TABLE "{name}" ({", ".join([*defs, *fk_constraints(model), *sql_constraints])}) {without_row_id}'.strip()
 
 
 def fk_constraints(model: type):
@@ -127,12 +530,3 @@ def fk_constraints(model: type):
         for fk in [field.metadata.get("fk")]
         if fk is not None
     )
-
-
-def drop_table(db: DatabaseConnection, table_name: str):
-    db.execute(
-        f"""
-        DROP TABLE {table_name}
-        """,
-    )
-    logger.info(f"Table dropped: {table_name}")
@@ -1,11 +1,14 @@
+import re
 import logging
 import dataclasses as dc
 import sqlite3
-from collections.abc import Sequence
+from operator import itemgetter, attrgetter
+from collections.abc import Sequence, Iterable, Callable
 from typing import (
     dataclass_transform,
     Any,
     Optional,
+    Union,
     TypeVar,
     ClassVar,
     Generic,
@@ -31,7 +34,7 @@ class Adapter(Generic[T]):
     def convert(self, b: bytes) -> T:
         ...  # pragma: no cover
 
-    def adapt(self, val: T) -> str:
+    def adapt(self, val: T) -> str | int:
         ...  # pragma: no cover
 
 
@@ -39,7 +42,10 @@ class DatabaseConnection(Protocol):
     def close(self) -> None:
         ...  # pragma: no cover
 
-    def execute(self, statement: str, **kwargs: Any) -> sqlite3.Cursor:
+    def execute(self, statement: str, parameters: Any = ..., /) -> sqlite3.Cursor:
+        ...  # pragma: no cover
+
+    def executemany(self, statement: str, parameters: Iterable[Any], /) -> sqlite3.Cursor:
         ...  # pragma: no cover
 
 
@@ -50,6 +56,8 @@ class Context:
     MODEL_TO_TABLE: dict[type, str] = dict()
     TABLE_TO_MODEL: dict[str, type] = dict()
 
+    DECODERS: dict[tuple[type, tuple[str, ...], bool], "RowDecoder[Any]"] = dict()
+
     @classmethod
     def setup(cls):
         cls.PYTHON_TO_SQL_MAPPING = cls.python_to_sql_mapping()
@@ -94,7 +102,7 @@ def model(sql_table_name: str):
 def validate_model(model: type):
     has_primary = False
     for field in dc.fields(model):
-        to_sql_type(field.type)
+        field_sql_type(field)
 
         if field.metadata.get("pk"):
             if has_primary:
@@ -115,7 +123,76 @@ class ForeignKey:
         )
 
 
-def field(*, pk: bool = False, fk: Optional[str] = None, **kwargs: Any):
+class Index:
+    """
+    Model level index declaration. Assign a list of these to a model's ``indexes`` class attribute:
+
+    .. code-block:: python
+
+        @model("orders")
+        class Order:
+            customer_id: int
+            placed_at: datetime
+            deleted: bool = False
+
+            indexes = [
+                Index("customer_id", "placed_at"),
+                Index("lower(note)", name="ix_orders_note"),
+                Index("placed_at", where="NOT deleted"),
+            ]
+
+    :param columns: Column names, or sql expressions for expression indexes
+    :param name: Defaults to a name derived from the table and columns
+    :param unique: Create a unique index
+    :param where: Condition for a partial index
+    """
+
+    def __init__(
+        self,
+        *columns: str,
+        name: Optional[str] = None,
+        unique: bool = False,
+        where: Optional[str] = None,
+    ):
+        self.columns = columns
+        self.name = name
+        self.unique = unique
+        self.where = where
+
+    def index_name(self, table: str) -> str:
+        if self.name:
+            return self.name
+        prefix = "ux" if self.unique else "ix"
+        parts = (re.sub(r"\W+", "_", column).strip("_") for column in self.columns)
+        return f"{prefix}_{table}_{'_'.join(parts)}"
+
+    def to_sql(self, table: str) -> str:
+        unique = "UNIQUE " if self.unique else ""
+        where = f" WHERE {self.where}" if self.where else ""
+        return f'CREATE {unique}INDEX "{self.index_name(table)}" ON "{table}" ({", ".join(self.columns)}){where}'
+
+
+def field(
+    *,
+    pk: bool = False,
+    fk: Optional[str] = None,
+    index: bool = False,
+    unique: bool = False,
+    adapter: Optional[Adapter[Any]] = None,
+    backfill: Union[str, Callable[[Any], Any], None] = None,
+    **kwargs: Any,
+):
+    """
+    :param pk: Marks the field as the table's primary key
+    :param fk: Foreign key reference, either "table" or "table.column"
+    :param index: Create an index on this column
+    :param unique: Create a unique index on this column
+    :param adapter: Overrides the globally registered adapter for this field's type.
+        e.g. to store one datetime column as epoch micros, while the rest are stored as text
+    :param backfill: How to fill in the column for existing rows, when migrate adds it to an existing table.
+        Either a sql expression over the row's columns, or a function from the model instance to the value.
+        The rows are updated in chunks by :func:`ormlite.run_backfills`, not by migrate itself
+    """
     foreign_key: Optional[ForeignKey] = None
     if fk:
         parts = fk.split(".")
@@ -126,15 +203,38 @@ def field(*, pk: bool = False, fk: Optional[str] = None, **kwargs: Any):
         key = get(parts, 1)
         foreign_key = ForeignKey(table=(table), key=key)
 
+    if adapter is not None:
+        register_converter(adapter)
+
     return dc.field(
         **kwargs,
         metadata={
             "pk": pk,
             "fk": foreign_key,
+            "index": index,
+            "unique": unique,
+            "adapter": adapter,
+            "backfill": backfill,
         },
     )
 
 
+def indexes(model: type) -> dict[str, str]:
+    """
+    All the indexes declared on a model, by field or by the ``indexes`` class attribute.
+
+    :returns: Map of index name to its CREATE INDEX statement
+    """
+    table = sql_table_name(model)
+    declared = [
+        Index(field.name, unique=field.metadata.get("unique", False))
+        for field in dc.fields(model)
+        if field.metadata.get("index") or field.metadata.get("unique")
+    ]
+    declared.extend(getattr(model, "indexes", []))
+    return {index.index_name(table): index.to_sql(table) for index in declared}
+
+
 def get(seq: Sequence[T], index: int) -> Optional[T]:
     if index >= len(seq):
         return None
@@ -162,9 +262,7 @@ def to_sql_literal(value: Any) -> str:
 
     adapter = Context.ADAPTERS.get(type(value))
     if adapter:
-        # TODO: sqlite escape text contents
-        # ASSUMPTION: custom adapters always encode to text
-        return f"'{adapter.adapt(value)}'"
+        return to_sql_literal(adapter.adapt(value))
 
     raise MissingAdapterError
 
@@ -179,9 +277,50 @@ def to_sql_type(field: type) -> str:
     raise MissingAdapterError
 
 
-def column_def(field: dc.Field[Any]) -> str:
-    optional_inner_type = get_optional_type_arg(field.type)
+def field_sql_type(field: dc.Field[Any]) -> str:
+    adapter = field.metadata.get("adapter")
+    if adapter is not None:
+        return adapter.sql_type
+    return to_sql_type(field.type)
+
+
+def encode_value(field: dc.Field[Any], value: Any) -> Any:
+    """
+    Applies the field's own adapter, if it has one.
+    Otherwise the value is returned as is, for sqlite3's globally registered adapters to handle.
+    """
+    adapter = field.metadata.get("adapter")
+    if adapter is None or value is None:
+        return value
+    return adapter.adapt(value)
+
+
+def row_encoder(model: type) -> Callable[[Any], tuple[Any, ...]]:
+    """
+    Builds a function converting a model instance into a tuple of sql parameters, in field order.
+    """
+    fields = dc.fields(model)
+    values = attrgetter(*(field.name for field in fields))
+    if len(fields) == 1:
+        get_values: Callable[[Any], tuple[Any, ...]] = lambda record: (values(record),)
+    else:
+        get_values = values
 
+    encoded = [(i, field.metadata["adapter"]) for i, field in enumerate(fields) if field.metadata.get("adapter")]
+    if not encoded:
+        return get_values
+
+    def encode(record: Any) -> tuple[Any, ...]:
+        params = list(get_values(record))
+        for i, adapter in encoded:
+            if params[i] is not None:
+                params[i] = adapter.adapt(params[i])
+        return tuple(params)
+
+    return encode
+
+
+def column_def(field: dc.Field[Any]) -> str:
     # not null is applied to all fields automatically
     # use default = None to get a nullable field
     constraint = "NOT NULL"
@@ -189,17 +328,137 @@ def column_def(field: dc.Field[Any]) -> str:
     if field.metadata.get("pk"):
         constraint = "PRIMARY KEY"
 
-    elif field.default is None or optional_inner_type is not None:
+    elif is_nullable(field):
         constraint = ""
 
-    # nullable, since we can't convert a python factory into a sql factory
-    elif field.default_factory != dc.MISSING:
-        constraint = ""
+    elif (default := column_default(field)) is not None:
+        constraint = f"DEFAULT {default} NOT NULL"
+
+    return f"{field.name} {field_sql_type(field)} {constraint}".strip()
+
+
+def is_nullable(field: dc.Field[Any]) -> bool:
+    if field.metadata.get("pk"):
+        return False
+    # fields with a default factory are nullable, since we can't convert a python factory into a sql factory
+    return (
+        field.default is None
+        or get_optional_type_arg(field.type) is not None
+        or field.default_factory != dc.MISSING
+    )
+
+
+def column_default(field: dc.Field[Any]) -> Optional[str]:
+    """
+    The sql literal of the column's DEFAULT, if it has one.
+    """
+    if field.metadata.get("pk") or is_nullable(field) or field.default is dc.MISSING:
+        return None
+    return to_sql_literal(encode_value(field, field.default))
+
+
+class _Deferred:
+    def __repr__(self) -> str:
+        return "DEFERRED"
+
+    def __reduce__(self) -> str:
+        # unpickle as the module's singleton, e.g. in models sent back from parallel reads
+        return "DEFERRED"
 
-    elif field.default != dc.MISSING:
-        constraint = f"DEFAULT {to_sql_literal(field.default)} NOT NULL"
 
-    return f"{field.name} {to_sql_type(field.type)} {constraint}".strip()
+# Placeholder value for fields that were not loaded from the database
+DEFERRED: Any = _Deferred()
+
+
+class RowDecoder(Generic[T]):
+    """
+    Converts raw cursor rows into model instances for one specific column layout.
+    All the column name lookups happen once, when the decoder is built,
+    so decoding a row is just tuple indexing and a positional constructor call.
+
+    Partial decoders accept layouts missing some of the model's fields.
+    Those build instances without calling __init__, and set the missing fields to :data:`DEFERRED`.
+    """
+
+    def __init__(self, model: type[T], columns: tuple[str, ...], *, partial: bool = False):
+        field_names = [field.name for field in model_fields(model)]
+        positions: dict[str, int] = dict()
+        for i, column in enumerate(columns):
+            positions.setdefault(column, i)
+
+        if partial:
+            loaded = [name for name in field_names if name in positions]
+        else:
+            loaded = field_names
+        model_indices = [positions[name] for name in loaded]
+        extra_indices = [i for i, column in enumerate(columns) if column not in field_names]
+
+        self.model = model
+        self.columns = columns
+        self.extra_columns = tuple(columns[i] for i in extra_indices)
+        self._loaded = loaded
+        self._deferred = [name for name in field_names if name not in loaded]
+        self._model_count = len(model_indices)
+        self._model_prefix = model_indices == list(range(len(model_indices)))
+        self._model_values = _tuple_getter(model_indices)
+        self._extra_values = _tuple_getter(extra_indices)
+
+    def to_model(self, row: Sequence[Any]) -> T:
+        if self._deferred:
+            return self._to_partial_model(row)
+        if self._model_prefix:
+            return self.model(*row[: self._model_count])
+        return self.model(*self._model_values(row))
+
+    def _to_partial_model(self, row: Sequence[Any]) -> T:
+        instance = object.__new__(self.model)
+        for name, value in zip(self._loaded, self._model_values(row)):
+            setattr(instance, name, value)
+        for name in self._deferred:
+            setattr(instance, name, DEFERRED)
+        return instance
+
+    def to_extra(self, row: Sequence[Any]) -> dict[str, Any]:
+        return dict(zip(self.extra_columns, self._extra_values(row)))
+
+    def to_dict(self, row: Sequence[Any]) -> dict[str, Any]:
+        return dict(zip(self.columns, row))
+
+
+def _tuple_getter(indices: list[int]) -> Callable[[Sequence[Any]], Sequence[Any]]:
+    if len(indices) == 0:
+        return lambda _: ()
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indices)
+
+
+def row_decoder(
+    model: type[T], description: Sequence[Sequence[Any]], *, partial: bool = False
+) -> RowDecoder[T]:
+    """
+    Get the decoder for a model and a cursor description.
+    Decoders are cached per (model, column layout) pair.
+    """
+    columns = tuple(column[0] for column in description)
+    key = (model, columns, partial)
+    decoder = Context.DECODERS.get(key)
+    if decoder is None:
+        decoder = Context.DECODERS[key] = RowDecoder(model, columns, partial=partial)
+    return decoder
+
+
+def model_fields(model: type) -> tuple[dc.Field[Any], ...]:
+    """
+    The model's dataclass fields.
+    Takes a plain type, for callers holding a model type variable, which isn't known to be a dataclass.
+    """
+    return dc.fields(model)
+
+
+def primary_key(model: type) -> Optional[dc.Field[Any]]:
+    return next((field for field in dc.fields(model) if field.metadata.get("pk")), None)
 
 
 def models() -> dict[str, type]:
@@ -211,6 +470,17 @@ def sql_table_name(model: type) -> str:
 
 
 def register_adapter(adapter: Adapter[Any]):
+    """
+    Make this adapter the default for its python type.
+    """
     Context.ADAPTERS[adapter.python_type] = adapter
+    Context.PYTHON_TO_SQL_MAPPING[adapter.python_type] = adapter.sql_type
     sqlite3.register_adapter(adapter.python_type, adapter.adapt)
+    register_converter(adapter)
+
+
+def register_converter(adapter: Adapter[Any]):
+    """
+    Decode columns declared with this adapter's sql type, without making it the default for its python type.
+    """
     sqlite3.register_converter(adapter.sql_type, adapter.convert)
@@ -0,0 +1,107 @@
+"""
+Parallel reads, see :meth:`ormlite.query.SelectQuery.iter_models_parallel`.
+
+Each shard of a query runs in a worker process, on that process's own read only connection.
+Shards are submitted as pickled queries, and their models are pickled back,
+so the model classes must be importable by the workers, e.g. defined at module level.
+"""
+from __future__ import annotations
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Optional
+from collections.abc import Iterable, Iterator
+
+from ormlite.sqlite import connect_to_sqlite, Settings
+
+if TYPE_CHECKING:
+    from ormlite.query import SelectQuery
+
+# Shards per worker when the caller doesn't choose.
+# Smaller shards even out skewed key ranges, and bound the memory each result holds.
+SHARDS_PER_WORKER = 4
+
+# Most keys in one shard when the caller doesn't choose, so a shard's pickled result stays small on large tables
+MAX_SHARD_KEYS = 10_000
+
+# Shards submitted ahead of the consumer, per worker.
+# Finished shards wait in the parent process until they're yielded, so this bounds the models held there
+IN_FLIGHT_PER_WORKER = 2
+
+# Per worker process connections, keyed by file name and pragmas
+_CONNECTIONS: dict[tuple[str, tuple[str, ...]], sqlite3.Connection] = {}
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def default_shards(low: int, high: int, workers: int) -> int:
+    return max(workers * SHARDS_PER_WORKER, -(-(high - low + 1) // MAX_SHARD_KEYS))
+
+
+def key_ranges(low: int, high: int, shards: int) -> list[tuple[int, int]]:
+    """
+    Split the inclusive range [low, high] into at most this many contiguous inclusive ranges.
+    """
+    step = max(-(-(high - low + 1) // shards), 1)
+    return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+
+def iter_shards(
+    file_name: str,
+    settings: Optional[Settings],
+    shards: Iterable[SelectQuery[Any]],
+    params: dict[str, Any],
+    *,
+    workers: int,
+    ordered: bool,
+) -> Iterator[Any]:
+    """
+    Run the shards on a process pool, and yield their models.
+    At most :data:`IN_FLIGHT_PER_WORKER` shards per worker are submitted ahead of the ones being yielded.
+
+    :param ordered: Yield the shards in the given order, instead of as soon as each one finishes
+    """
+    pending = iter(shards)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    in_flight: deque[Future[list[Any]]] = deque()
+
+    def submit(count: int):
+        for shard in pending:
+            in_flight.append(pool.submit(_read_shard, file_name, settings, shard, params))
+            count -= 1
+            if count == 0:
+                return
+
+    try:
+        submit(workers * IN_FLIGHT_PER_WORKER)
+        while in_flight:
+            if ordered:
+                future = in_flight.popleft()
+            else:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                future = done.pop()
+                in_flight.remove(future)
+            models = future.result()
+            # keep the workers busy while the consumer works through this shard
+            submit(1)
+            yield from models
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _read_shard(
+    file_name: str, settings: Optional[Settings], shard: SelectQuery[Any], params: dict[str, Any]
+) -> list[Any]:
+    return shard.models(_connection(file_name, settings), **params)
+
+
+def _connection(file_name: str, settings: Optional[Settings]) -> sqlite3.Connection:
+    key = (file_name, tuple(settings.pragmas()) if settings else ())
+    db = _CONNECTIONS.get(key)
+    if db is None:
+        db = _CONNECTIONS[key] = connect_to_sqlite(file_name, settings)
+        db.execute("PRAGMA query_only = ON")
+    return db
@@ -1,23 +1,42 @@
 from __future__ import annotations
+import re
+import json
+import base64
 import logging
 import dataclasses as dc
 import sqlite3
 from typing import Generic, TypeVar, Optional, Any, Callable
+from collections.abc import Iterable, Iterator, AsyncIterator, Generator, Sequence
+from itertools import chain
 from dataclasses import dataclass
 
-from ormlite import orm
-from ormlite.orm import to_sql_literal, DatabaseConnection as DbConnection
+from ormlite import orm, instrument, sqlite, cache, columnar, parallel
+from ormlite.orm import DatabaseConnection as DbConnection
+from ormlite.aio import AsyncConnection
+from ormlite.cache import QueryCache
+from ormlite.errors import InvalidJoinError, MissingPrimaryKeyError
 
 logger = logging.getLogger(__name__)
 
 
 Model = TypeVar("Model")
+T = TypeVar("T")
+
+# Number of rows pulled from the cursor at a time by the lazy iter_* methods
+DEFAULT_BATCH_SIZE = 1000
 
 
 @dataclass
 class Row(Generic[Model]):
+    """
+    :param model: The queried model
+    :param extra: Columns selected with :meth:`SelectQuery.extra`
+    :param related: Related model instances, keyed by their model class
+    """
+
     model: Model
     extra: dict
+    related: dict[type, Any] = dc.field(default_factory=dict)
 
 
 class SelectQuery(Generic[Model]):
@@ -26,61 +45,194 @@ class SelectQuery(Generic[Model]):
     This object is mutable and chainable way to describe a sql query.
     These methods mutate the builder and return the builder to continue the chain:
         - extra
+        - only
+        - defer
         - where
         - limit
         - join
+        - prefetch
+        - cache
         - order_by
+        - group_by
+        - having
 
     These methods execute the current query:
         - rows
         - models
         - dicts
+        - models_with_related
+        - paginate
+        - count
+        - exists
+        - aggregate
+        - scalar
+        - update
+        - delete
+        - columns
+
+    Each of those also has a lazy iter_* variant, which streams results from the cursor in batches,
+    and *_async variants for use with an :class:`ormlite.aio.AsyncConnection`.
+
+    Use :meth:`compile` to freeze the query into a reusable :class:`CompiledQuery`.
     """
 
     def __init__(self, model: type[Model]):
         self.model = model
-        self.model_field_count = len(dc.fields(self.model))
         self.extra_columns = []
-        self.join_clause = ""
+        self.joined_models: list[type[Any]] = []
+        self.join_clauses: list[str] = []
+        self.prefetches: list[Prefetch] = []
+        self.result_cache: Optional[QueryCache] = None
+        self.deferred_fields: list[str] = []
         self.where_clause = ""
+        self.group_by_clause = ""
+        self.having_clause = ""
         self.order_by_clause = ""
         self.limit_clause = ""
+        self.params: dict[str, Any] = dict()
 
-    # TODO: allow multiple joins via join dict ala ruby on rails
-    # allow multiple calls to join
     def join(self, model: type[Any], /) -> SelectQuery[Model]:
         """
         Join with another table.
+        Joins can be chained, each join links the new model by a foreign key
+        to or from the queried model or any previously joined model.
+
         :param: model
         """
         target_table = orm.sql_table_name(model)
-        field = next(
-            field
-            for field in dc.fields(self.model)
-            if get_fk_table(field) == target_table
-        )
-        self.join_clause = _prepare_join(
-            source_table=orm.sql_table_name(self.model),
-            target_table=target_table,
-            source_key=field.name,
-            target_key=field.metadata["fk"].key or field.name,
-        )
+        for source in [self.model, *self.joined_models]:
+            source_table = orm.sql_table_name(source)
+            # source references target
+            for field in orm.model_fields(source):
+                if get_fk_table(field) == target_table:
+                    return self._add_join(
+                        model,
+                        _prepare_join(
+                            source_table=source_table,
+                            target_table=target_table,
+                            source_key=field.name,
+                            target_key=field.metadata["fk"].key or field.name,
+                        ),
+                    )
+            # target references source
+            for field in orm.model_fields(model):
+                if get_fk_table(field) == source_table:
+                    return self._add_join(
+                        model,
+                        _prepare_join(
+                            source_table=source_table,
+                            target_table=target_table,
+                            source_key=field.metadata["fk"].key or field.name,
+                            target_key=field.name,
+                        ),
+                    )
+
+        raise InvalidJoinError(f"No foreign key links {target_table} to the query")
+
+    def _add_join(self, model: type[Any], clause: str) -> SelectQuery[Model]:
+        if model is self.model or model in self.joined_models:
+            raise InvalidJoinError(f"{orm.sql_table_name(model)} is already part of the query")
+        self.joined_models.append(model)
+        self.join_clauses.append(clause)
+        return self
+
+    def prefetch(self, model: type[Any], /) -> SelectQuery[Model]:
+        """
+        Load a related model with a separate query per batch of results, instead of a join.
+        Useful when a join would multiply the number of result rows.
+
+        The related instances are attached to each :class:`Row`'s related dict, by :meth:`rows` and :meth:`models_with_related`.
+        If the queried model has the foreign key, the related value is the referenced instance, or None.
+        If the related model has the foreign key, the related value is the list of instances referencing the row.
+
+        :param model: Related model, linked to the queried model by a field(fk=...) on either side
+        """
+        target_table = orm.sql_table_name(model)
+        source_table = orm.sql_table_name(self.model)
+        for field in orm.model_fields(self.model):
+            if get_fk_table(field) == target_table:
+                key = field.metadata["fk"].key or field.name
+                self.prefetches.append(Prefetch(model, source_key=field.name, target_key=key, many=False))
+                return self
+
+        for field in orm.model_fields(model):
+            if get_fk_table(field) == source_table:
+                key = field.metadata["fk"].key or field.name
+                self.prefetches.append(Prefetch(model, source_key=key, target_key=field.name, many=True))
+                return self
+
+        raise InvalidJoinError(f"No foreign key links {target_table} to {source_table}")
+
+    def cache(self, cache: QueryCache, /) -> SelectQuery[Model]:
+        """
+        Serve this query's results from the cache, when possible.
+        Applies to the list returning methods: models, rows, dicts and models_with_related.
+        """
+        self.result_cache = cache
+        return self
+
+    def _cached(self, db: DbConnection, kind: str, load: Callable[[], list[T]], params: Params) -> list[T]:
+        if self.result_cache is None:
+            return load()
+
+        bound = tuple(self._params(params).items())
+        key = (kind, self._sql(), bound, tuple(p.model for p in self.prefetches))
+        tables = [orm.sql_table_name(model) for model in [self.model, *self.joined_models]]
+        tables.extend(orm.sql_table_name(prefetch.model) for prefetch in self.prefetches)
+        return list(self.result_cache.get_or_load(db, key, tables, load))
+
+    def only(self, *fields: str) -> SelectQuery[Model]:
+        """
+        Only load these fields of the model, defer the rest.
+        See :meth:`defer`.
+        """
+        names = [field.name for field in orm.model_fields(self.model)]
+        self._check_field_names(fields)
+        return self.defer(*(name for name in names if name not in fields))
+
+    def defer(self, *fields: str) -> SelectQuery[Model]:
+        """
+        Skip loading these fields, e.g. to avoid reading large text or blob columns.
+        Deferred fields are set to :data:`ormlite.orm.DEFERRED` on the loaded models,
+        use :func:`load_deferred` to fill them in later.
+        :meth:`models_with_related` always loads every field, and :meth:`prefetch` always loads the keys it matches on.
+        """
+        self._check_field_names(fields)
+        self.deferred_fields = [*self.deferred_fields, *(name for name in fields if name not in self.deferred_fields)]
         return self
 
+    def _check_field_names(self, fields: Iterable[str]):
+        names = {field.name for field in orm.model_fields(self.model)}
+        unknown = [field for field in fields if field not in names]
+        if unknown:
+            raise ValueError(f"{self.model.__name__} has no fields named: {', '.join(unknown)}")
+
     def extra(self, *fields: str) -> SelectQuery[Model]:
         self.extra_columns = list(fields)
         return self
 
     def where(self, condition: Optional[str] = None, /, **kwargs: Any) -> SelectQuery[Model]:
+        """
+        Filter the query.
+        Values are never spliced into the sql text, they are bound as named parameters.
+        So repeated queries with different values reuse the same prepared statement.
+
+        :param condition: Raw sql condition, which may reference values with ``:name`` placeholders.
+            A placeholder named after a field with its own ``field(adapter=...)`` is encoded with that adapter,
+            when the value is of the adapter's python type
+        :param kwargs: With a condition, the values for its placeholders. Without one, column equality checks
+        """
         if condition:
-            for key, value in kwargs.items():
-                condition = condition.replace(f":{key}", to_sql_literal(value))
-            conditions = [condition]
+            conditions = [self._bind_condition(condition, kwargs)]
         else:
             table_name = orm.sql_table_name(self.model)
+            fields = {field.name: field for field in orm.model_fields(self.model)}
             conditions = []
             for key, value in kwargs.items():
-                conditions.append(f"{table_name}.{key} = {to_sql_literal(value)}")
+                field = fields.get(key)
+                if field is not None:
+                    value = orm.encode_value(field, value)
+                conditions.append(f"{table_name}.{key} = {self._bind(key, value)}")
 
         for condition in conditions:
             if self.where_clause == "":
@@ -90,6 +242,59 @@ class SelectQuery(Generic[Model]):
 
         return self
 
+    def _bind_condition(self, condition: str, values: dict[str, Any]) -> str:
+        adapted = self._adapted_fields()
+        for key, value in values.items():
+            field = adapted.get(key)
+            if field is not None:
+                value = _encode_field_value(field, value)
+            placeholder = self._bind(key, value)
+            condition = re.sub(rf":{key}\b", lambda _: placeholder, condition)
+        return condition
+
+    def _adapted_fields(self) -> dict[str, dc.Field[Any]]:
+        """
+        Fields with their own ``field(adapter=...)``, by name, whose placeholders are encoded with that adapter.
+        """
+        fields = orm.model_fields(self.model)
+        return {field.name: field for field in fields if field.metadata.get("adapter") is not None}
+
+    def _bind(self, key: str, value: Any) -> str:
+        """
+        Store a value as a query parameter and return the placeholder sql to reference it.
+        Lists and tuples expand to one parameter per item, e.g. for use with IN.
+        """
+        if isinstance(value, (list, tuple)):
+            items = ",".join(self._bind(key, item) for item in value)  # pyright: ignore
+            return f"({items})"
+
+        name = f"_{key}_{len(self.params)}"
+        self.params[name] = value
+        return f":{name}"
+
+    def group_by(self, *columns: str) -> SelectQuery[Model]:
+        """
+        Group the rows, for use with :meth:`aggregate`.
+        Note that calling this multiple times on the same query, will override the previous grouping.
+        """
+        self.group_by_clause = f"GROUP BY {','.join(columns)}"
+        return self
+
+    def having(self, condition: str, /, **kwargs: Any) -> SelectQuery[Model]:
+        """
+        Filter the groups made by :meth:`group_by`.
+        Multiple calls are combined with AND.
+
+        :param condition: Raw sql condition, which may reference values with ``:name`` placeholders
+        :param kwargs: The values for its placeholders, bound the same way as :meth:`where`
+        """
+        condition = self._bind_condition(condition, kwargs)
+        if self.having_clause == "":
+            self.having_clause = f"HAVING ({condition})"
+        else:
+            self.having_clause += f" AND ({condition})"
+        return self
+
     def order_by(self, clause: str, /) -> SelectQuery[Model]:
         self.order_by_clause = f"ORDER BY {clause}"
         return self
@@ -102,57 +307,703 @@ class SelectQuery(Generic[Model]):
         self.limit_clause = f"LIMIT {limit}"
         return self
 
-    def _execute(self, db: DbConnection) -> sqlite3.Cursor:
+    def _sql(self, *, with_related: bool = False) -> str:
         extra = ""
         if self.extra_columns:
             extra = f",{','.join(self.extra_columns)}"
 
         table_name = orm.sql_table_name(self.model)
-        query = f"""
-            SELECT \"{table_name}\".*{extra}
-            FROM \"{table_name}\"
-            {self.join_clause}
-            {self.where_clause}
+        columns = f'"{table_name}".*'
+        if self.deferred_fields and not with_related:
+            # prefetches match related rows on their source keys, so those are loaded even when deferred
+            source_keys = {prefetch.source_key for prefetch in self.prefetches}
+            columns = ",".join(
+                f'"{table_name}".{field.name}'
+                for field in orm.model_fields(self.model)
+                if field.name not in self.deferred_fields or field.name in source_keys
+            )
+        elif with_related:
+            columns = ",".join(
+                f'"{orm.sql_table_name(model)}".{field.name}'
+                for model in [self.model, *self.joined_models]
+                for field in orm.model_fields(model)
+            )
+
+        return f"""
+            SELECT {columns}{extra}
+            {self._from_sql()}
             {self.order_by_clause}
             {self.limit_clause}
         """
+
+    def _from_sql(self) -> str:
+        return f"""
+            FROM \"{orm.sql_table_name(self.model)}\"
+            {" ".join(self.join_clauses)}
+            {self.where_clause}
+            {self.group_by_clause}
+            {self.having_clause}
+        """
+
+    def _params(self, params: Params) -> dict[str, Any]:
+        if not params:
+            return self.params
+        adapted = self._adapted_fields()
+        bound = dict(self.params)
+        for key, value in params.items():
+            if isinstance(value, (list, tuple)):
+                # the sql is already built, so there's no expanding the placeholder into one per item
+                raise ValueError(f"Call time value for :{key} can't be a list, bind it with where() instead")
+            field = adapted.get(key)
+            bound[key] = _encode_field_value(field, value) if field is not None else value
+        return bound
+
+    def _fetch_batches(
+        self,
+        db: DbConnection,
+        query: str,
+        params: Params,
+        batch_size: int,
+        convert: Optional[Callable[[Description], Callable[[Any], Any]]] = None,
+    ) -> tuple[sqlite3.Cursor, Generator[list[Any], None, None]]:
+        bound = self._params(params)
+        logger.debug(query)
+        instrument.check_full_scans(db, query, bound)
+        return instrument.fetch_batches(db, query, bound, batch_size, convert)
+
+    def _converter(self, decode: Decode[Model, T], description: Description) -> Callable[[Any], T]:
+        return decode(self, description)
+
+    def _fetch_sql(self, db: DbConnection, query: str, params: Params) -> list[Any]:
+        bound = self._params(params)
+        logger.debug(query)
+        instrument.check_full_scans(db, query, bound)
+        return instrument.fetchall(db, query, bound)
+
+    def explain(self, db: DbConnection, /, **params: Any) -> list[instrument.PlanStep]:
+        """
+        Runs EXPLAIN QUERY PLAN for the current query.
+        """
+        return instrument.explain(db, self._sql(), self._params(params))
+
+    def _copy_state(self, query: SelectQuery[Model]):
+        self.extra_columns = list(query.extra_columns)
+        self.joined_models = list(query.joined_models)
+        self.join_clauses = list(query.join_clauses)
+        self.prefetches = list(query.prefetches)
+        self.result_cache = query.result_cache
+        self.where_clause = query.where_clause
+        self.group_by_clause = query.group_by_clause
+        self.having_clause = query.having_clause
+        self.order_by_clause = query.order_by_clause
+        self.limit_clause = query.limit_clause
+        self.params = dict(query.params)
+        self.deferred_fields = list(query.deferred_fields)
+
+    def paginate(
+        self,
+        db: DbConnection,
+        /,
+        *,
+        size: int,
+        after: Optional[str] = None,
+        key: Optional[Sequence[str]] = None,
+        **params: Any,
+    ) -> Page[Model]:
+        """
+        Keyset pagination.
+        Instead of skipping rows with an OFFSET, each page seeks directly past the last key of the previous page,
+        so deep pages are as cheap as the first one, given an index on the key.
+
+        This overrides any order_by and limit set on the query.
+
+        :param size: Maximum number of models per page
+        :param after: The :attr:`Page.next` token of the previous page. None for the first page
+        :param key: Columns to order by, e.g. the columns of a declared index.
+            Defaults to the primary key, or the rowid for tables without one.
+            The primary key (or rowid) is appended when missing, so the order is always unique.
+        :param params: Values for unbound placeholders, like the other execution methods
+        """
+        table = orm.sql_table_name(self.model)
+        pk_field = orm.primary_key(self.model)
+        unique_key = pk_field.name if pk_field else "rowid"
+        columns = list(key or [])
+        if unique_key not in columns:
+            columns.append(unique_key)
+
+        fields = {field.name: field for field in orm.model_fields(self.model)}
+        key_sql = ",".join(f'"{table}".{column}' for column in columns)
+
+        query = SelectQuery(self.model)
+        query._copy_state(self)
+        query.extra_columns = [*self.extra_columns, *(f'"{table}".{column}' for column in columns)]
+        if after is not None:
+            query.where(f"({key_sql}) > :after", after=_decode_page_token(after, columns))
+        query.order_by(key_sql)
+        query.limit(size + 1)
+
+        batches = query._decoded_batches(db, size + 1, _to_model_and_raw, params=params)
+        results = [item for batch in batches for item in batch]
+
+        next_token = None
+        if len(results) > size:
+            results = results[:size]
+            _, last = results[-1]
+            values = [_token_value(fields.get(column), value) for column, value in zip(columns, last[-len(columns) :])]
+            next_token = _encode_page_token(columns, values)
+
+        return Page(models=[model for model, _ in results], next=next_token)
+
+    def compile(self) -> CompiledQuery[Model]:
+        """
+        Freeze the query into a reusable template.
+        The sql is built once, and the decoder once per kind of result,
+        so executing the compiled query does no string building.
+
+        Placeholders left unbound by :meth:`where` are filled in when executing:
+
+        .. code-block:: python
+
+            adults = select(User).where("age > :age").compile()
+            adults.models(db, age=30)
+
+        These values are encoded like :meth:`where` values, but can't be lists,
+        since the placeholder can't be expanded once the sql is built.
+        """
+        return CompiledQuery(self)
+
+    # The execution methods take values for the query's unbound :name placeholders as keyword arguments
+
+    def count(self, db: DbConnection, /, **params: Any) -> int:
+        """
+        Count the matching rows in sqlite, without loading them.
+        Joins count the same way as in :meth:`models`, once per joined row.
+        With a :meth:`group_by`, this counts the groups instead.
+        """
+        if self.group_by_clause or self.limit_clause:
+            query = f"SELECT COUNT(*) FROM (SELECT 1 {self._from_sql()} {self.order_by_clause} {self.limit_clause})"
+        else:
+            query = f"SELECT COUNT(*) {self._from_sql()}"
+        ((count,),) = self._fetch_sql(db, query, params)
+        return count
+
+    def exists(self, db: DbConnection, /, **params: Any) -> bool:
+        """
+        Whether any row matches. Sqlite stops at the first match.
+        """
+        query = f"SELECT EXISTS (SELECT 1 {self._from_sql()} {self.order_by_clause} {self.limit_clause})"
+        ((exists,),) = self._fetch_sql(db, query, params)
+        return bool(exists)
+
+    def aggregate(self, db: DbConnection, /, *expressions: str, **params: Any) -> list[tuple[Any, ...]]:
+        """
+        Select sql expressions instead of models, e.g. aggregates over the :meth:`group_by` groups:
+
+        .. code-block:: python
+
+            select(Order).where(status="paid").group_by("customer_id").aggregate(db, "customer_id", "SUM(total)")
+
+        Without a group_by, the aggregates cover every matching row and the result is a single tuple.
+        A :meth:`limit` without a group_by limits the rows being aggregated,
+        the expressions can then only reference the queried model's columns and the :meth:`extra` columns.
+
+        :param expressions: Sql expressions, one per item of each returned tuple
+        """
+        columns = ",".join(expressions)
+        if self.limit_clause and not self.group_by_clause:
+            table = orm.sql_table_name(self.model)
+            query = f'SELECT {columns} FROM ({self._sql()}) AS "{table}"'
+        else:
+            query = f"SELECT {columns} {self._from_sql()} {self.order_by_clause} {self.limit_clause}"
+        return [tuple(row) for row in self._fetch_sql(db, query, params)]
+
+    def scalar(self, db: DbConnection, expression: str, /, **params: Any) -> Any:
+        """
+        Shorthand for the single value of an :meth:`aggregate`, e.g. ``query.scalar(db, "MAX(age)")``.
+        Returns None when there are no rows.
+        """
+        results = self.aggregate(db, expression, **params)
+        return results[0][0] if results else None
+
+    def update(self, db: DbConnection, /, **values: Any) -> int:
+        """
+        Set fields on every matching row, with a single UPDATE statement.
+        Values go through the same adapters as :func:`upsert`.
+        Unlike the other execution methods, the keyword arguments are the new values,
+        so every placeholder of the query must already be bound.
+
+        .. code-block:: python
+
+            select(Job).where("finished_at < :cutoff", cutoff=cutoff).update(db, status="expired")
+
+        :returns: The number of updated rows
+        """
+        if not values:
+            raise ValueError("update needs at least one field to set")
+        self._check_field_names(values)
+
+        # bound on a copy, so the new values share the where values' namespace without touching this query
+        bound = SelectQuery(self.model)
+        bound._copy_state(self)
+        fields = {field.name: field for field in orm.model_fields(self.model)}
+        assignments = [
+            f"{name} = {bound._bind(name, orm.encode_value(fields[name], value))}" for name, value in values.items()
+        ]
+
+        table = orm.sql_table_name(self.model)
+        query = f'UPDATE "{table}" SET {",".join(assignments)} {self._write_where_sql()}'
+        return self._write(db, query, bound.params)
+
+    def delete(self, db: DbConnection, /, **params: Any) -> int:
+        """
+        Delete every matching row, with a single DELETE statement.
+
+        :returns: The number of deleted rows
+        """
+        table = orm.sql_table_name(self.model)
+        query = f'DELETE FROM "{table}" {self._write_where_sql()}'
+        return self._write(db, query, self._params(params))
+
+    def _write_where_sql(self) -> str:
+        # UPDATE and DELETE can't join, group or (in most sqlite builds) limit,
+        # so those queries select the keys of the matching rows in a subquery instead
+        if not (self.join_clauses or self.group_by_clause or self.limit_clause):
+            return self.where_clause
+
+        table = orm.sql_table_name(self.model)
+        pk_field = orm.primary_key(self.model)
+        key = pk_field.name if pk_field else "rowid"
+        return f"""
+            WHERE {key} IN (
+                SELECT "{table}".{key} {self._from_sql()} {self.order_by_clause} {self.limit_clause}
+            )
+        """
+
+    def _write(self, db: DbConnection, query: str, parameters: dict[str, Any]) -> int:
         logger.debug(query)
+        cursor = instrument.execute(db, query, parameters)
+        cache.notify_write(orm.sql_table_name(self.model))
+        return cursor.rowcount
+
+    def models(self, db: DbConnection, /, **params: Any) -> list[Model]:
+        return self._cached(db, "models", lambda: list(self.iter_models(db, **params)), params)
 
-        return db.execute(query)
-
-    def models(self, db: DbConnection) -> list[Model]:
-        cursor = self._execute(db)
-        return [self._to_model(row) for row in cursor]
-
-    def dicts(self, db: DbConnection) -> list[dict[str, Any]]:
-        rows = []
-        cursor = self._execute(db)
-        for raw in cursor:
-            extra = dict()
-            for desc, value in zip(cursor.description, raw):
-                key = desc[0]
-                extra[key] = value
-            rows.append(extra)
-        return rows
-
-    def rows(self, db: DbConnection) -> list[Row[Model]]:
-        rows = []
-        cursor = self._execute(db)
-        model_fields = set(field.name for field in dc.fields(self.model))
-        for raw in cursor:
-            extra = dict()
-            model_dict = dict()
-            for desc, value in zip(cursor.description, raw):
-                key = desc[0]
-                if key in model_fields:
-                    model_dict[key] = value
+    def dicts(self, db: DbConnection, /, **params: Any) -> list[dict[str, Any]]:
+        return self._cached(db, "dicts", lambda: list(self.iter_dicts(db, **params)), params)
+
+    def rows(self, db: DbConnection, /, **params: Any) -> list[Row[Model]]:
+        return self._cached(db, "rows", lambda: list(self.iter_rows(db, **params)), params)
+
+    def iter_models(
+        self, db: DbConnection, /, *, batch_size: int = DEFAULT_BATCH_SIZE, **params: Any
+    ) -> Iterator[Model]:
+        """
+        Lazy counterpart of :meth:`models`.
+        Rows are pulled from sqlite in batches, so memory use is bounded by the batch size instead of the result size.
+        """
+        for batch in self._decoded_batches(db, batch_size, _to_model, params=params):
+            yield from batch
+
+    def iter_dicts(
+        self, db: DbConnection, /, *, batch_size: int = DEFAULT_BATCH_SIZE, **params: Any
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Lazy counterpart of :meth:`dicts`.
+        """
+        for batch in self._decoded_batches(db, batch_size, _to_dict, params=params):
+            yield from batch
+
+    def iter_rows(
+        self, db: DbConnection, /, *, batch_size: int = DEFAULT_BATCH_SIZE, **params: Any
+    ) -> Iterator[Row[Model]]:
+        """
+        Lazy counterpart of :meth:`rows`.
+        """
+        for batch in self._row_batches(db, batch_size, _to_row, params=params):
+            yield from batch
+
+    def models_with_related(self, db: DbConnection, /, **params: Any) -> list[Row[Model]]:
+        """
+        Eagerly load the joined models, in the same query.
+        Each row's related dict maps every joined model class to its instance.
+        """
+        return self._cached(
+            db, "models_with_related", lambda: list(self.iter_models_with_related(db, **params)), params
+        )
+
+    def iter_models_with_related(
+        self, db: DbConnection, /, *, batch_size: int = DEFAULT_BATCH_SIZE, **params: Any
+    ) -> Iterator[Row[Model]]:
+        """
+        Lazy counterpart of :meth:`models_with_related`.
+        """
+        for batch in self._row_batches(db, batch_size, _to_related_row, with_related=True, params=params):
+            yield from batch
+
+    def columns(self, db: DbConnection, /, *, batch_size: int = DEFAULT_BATCH_SIZE, **params: Any) -> dict[str, Any]:
+        """
+        Load the results column by column, without creating an object per row.
+        Meant for analytical reads over many rows.
+
+        Returns a dict of column name to numpy array, when numpy is installed.
+        int, float and bool fields load as int64, float64 and bool arrays, and datetime fields as datetime64[us].
+        Without numpy, those columns are ``array.array`` buffers instead, with datetimes as microseconds since the unix epoch.
+        Other fields, and :meth:`extra` columns, are object arrays (or lists, without numpy) of the decoded values.
+
+        Nulls in float columns load as NaN, and raise a ValueError in the other typed columns.
+        Deferred fields are left out.
+        """
+        table = orm.sql_table_name(self.model)
+        fields = [field for field in orm.model_fields(self.model) if field.name not in self.deferred_fields]
+        selected = [columnar.select_expression(table, field) for field in fields]
+        query = f"""
+            SELECT {",".join([*selected, *self.extra_columns])}
+            {self._from_sql()}
+            {self.order_by_clause}
+            {self.limit_clause}
+        """
+        cursor, batches = self._fetch_batches(db, query, params, batch_size)
+        names = [column[0] for column in cursor.description]
+        kinds = [*map(columnar.column_kind, fields), *(None for _ in self.extra_columns)]
+        return columnar.build_columns(names, kinds, batches)
+
+    def iter_models_parallel(
+        self,
+        file_name: str,
+        /,
+        *,
+        workers: Optional[int] = None,
+        shards: Optional[int] = None,
+        ordered: bool = True,
+        settings: Optional[sqlite.Settings] = None,
+        **params: Any,
+    ) -> Iterator[Model]:
+        """
+        Parallel counterpart of :meth:`iter_models`, for scans feeding cpu bound post processing.
+
+        The query is split into ranges of the integer primary key, or the rowid for tables without a primary key.
+        Each range is read and decoded in a worker process, on its own read only connection to the database file.
+        Models are pickled back from the workers, so the model class must be importable, e.g. defined at module level.
+
+        :param file_name: Database file, opened in each worker like :func:`ormlite.connect_to_sqlite`
+        :param workers: Number of worker processes. Defaults to the number of cpus
+        :param shards: Number of key ranges. Defaults to a few per worker,
+            and more on large tables, to keep each range under :data:`ormlite.parallel.MAX_SHARD_KEYS` keys.
+            Only a couple of ranges per worker are read ahead of the consumer, so memory use is bounded by the range size
+        :param ordered: Yield models in key order. Otherwise each shard's models are yielded as soon as the shard finishes
+        :param settings: Pragmas for the worker connections
+        :param params: Values for unbound placeholders, like the other execution methods
+        """
+        if file_name == ":memory:":
+            raise ValueError("In memory databases can't be shared between processes")
+        if self.limit_clause or self.order_by_clause or self.group_by_clause:
+            raise ValueError("Parallel queries can't have a limit, order_by or group_by")
+
+        table = orm.sql_table_name(self.model)
+        pk_field = orm.primary_key(self.model)
+        if pk_field is None:
+            key = "rowid"
+        elif pk_field.type in (int, "int"):
+            key = pk_field.name
+        else:
+            raise ValueError(f"{table} can only be split into parallel reads by an integer primary key")
+
+        db = sqlite.connect_to_sqlite(file_name, settings)
+        try:
+            low, high = db.execute(f'SELECT MIN({key}), MAX({key}) FROM "{table}"').fetchone()
+        finally:
+            db.close()
+        if low is None:
+            return
+
+        workers = workers or parallel.default_workers()
+        ranges = parallel.key_ranges(low, high, shards or parallel.default_shards(low, high, workers))
+        queries = (self._shard(key, start, end, ordered=ordered) for start, end in ranges)
+        workers = min(workers, len(ranges))
+        yield from parallel.iter_shards(file_name, settings, queries, params, workers=workers, ordered=ordered)
+
+    def _shard(self, key: str, start: int, end: int, *, ordered: bool) -> SelectQuery[Model]:
+        table = orm.sql_table_name(self.model)
+        query = SelectQuery(self.model)
+        query._copy_state(self)
+        # caches hold locks and connections, which can't be sent to another process
+        query.result_cache = None
+        query.where(f'"{table}".{key} BETWEEN :start AND :end', start=start, end=end)
+        if ordered:
+            query.order_by(f'"{table}".{key}')
+        return query
+
+    async def models_async(self, db: AsyncConnection, /, **params: Any) -> list[Model]:
+        return await db.run(lambda conn: self.models(conn, **params))
+
+    async def dicts_async(self, db: AsyncConnection, /, **params: Any) -> list[dict[str, Any]]:
+        return await db.run(lambda conn: self.dicts(conn, **params))
+
+    async def rows_async(self, db: AsyncConnection, /, **params: Any) -> list[Row[Model]]:
+        return await db.run(lambda conn: self.rows(conn, **params))
+
+    def iter_models_async(
+        self, db: AsyncConnection, /, *, batch_size: int = DEFAULT_BATCH_SIZE, **params: Any
+    ) -> AsyncIterator[Model]:
+        """
+        Async counterpart of :meth:`iter_models`.
+        Each batch is fetched and decoded on the connection's worker thread.
+        """
+        return _iter_async(db, lambda conn: self._decoded_batches(conn, batch_size, _to_model, params=params))
+
+    def iter_dicts_async(
+        self, db: AsyncConnection, /, *, batch_size: int = DEFAULT_BATCH_SIZE, **params: Any
+    ) -> AsyncIterator[dict[str, Any]]:
+        return _iter_async(db, lambda conn: self._decoded_batches(conn, batch_size, _to_dict, params=params))
+
+    def iter_rows_async(
+        self, db: AsyncConnection, /, *, batch_size: int = DEFAULT_BATCH_SIZE, **params: Any
+    ) -> AsyncIterator[Row[Model]]:
+        return _iter_async(db, lambda conn: self._row_batches(conn, batch_size, _to_row, params=params))
+
+    def _decoded_batches(
+        self,
+        db: DbConnection,
+        batch_size: int,
+        decode: Decode[Model, T],
+        *,
+        with_related: bool = False,
+        params: Params = None,
+    ) -> Generator[list[T], None, None]:
+        _, batches = self._fetch_batches(
+            db,
+            self._sql(with_related=with_related),
+            params,
+            batch_size,
+            lambda description: self._converter(decode, description),
+        )
+        yield from batches
+
+    def _row_batches(
+        self,
+        db: DbConnection,
+        batch_size: int,
+        decode: Decode[Model, Row[Model]],
+        *,
+        with_related: bool = False,
+        params: Params = None,
+    ) -> Generator[list[Row[Model]], None, None]:
+        for batch in self._decoded_batches(db, batch_size, decode, with_related=with_related, params=params):
+            for prefetch in self.prefetches:
+                prefetch.attach(db, batch)
+            yield batch
+
+
+class CompiledQuery(SelectQuery[Model]):
+    """
+    A frozen :class:`SelectQuery`, created with :meth:`SelectQuery.compile`.
+    The sql strings are built once, and the row decoders are built on first use and then reused.
+    Calling a builder method on a compiled query raises a TypeError.
+    """
+
+    def __init__(self, query: SelectQuery[Model]):
+        super().__init__(query.model)
+        self._copy_state(query)
+
+        self._sql_cache = {
+            with_related: SelectQuery._sql(self, with_related=with_related) for with_related in (False, True)
+        }
+        self._converters: dict[Decode[Model, Any], Callable[[Any], Any]] = {}
+        self._adapted = SelectQuery._adapted_fields(self)
+
+    def _sql(self, *, with_related: bool = False) -> str:
+        return self._sql_cache[with_related]
+
+    def _adapted_fields(self) -> dict[str, dc.Field[Any]]:
+        return self._adapted
+
+    def _converter(self, decode: Decode[Model, T], description: Description) -> Callable[[Any], T]:
+        # the sql is fixed, so the column layout is too
+        converter = self._converters.get(decode)
+        if converter is None:
+            converter = self._converters[decode] = decode(self, description)
+        return converter
+
+    def compile(self) -> CompiledQuery[Model]:
+        return self
+
+    def _frozen(self, *_: Any, **__: Any) -> Any:
+        raise TypeError("Compiled queries can't be modified")
+
+    join = prefetch = cache = extra = only = defer = where = group_by = having = order_by = limit = _frozen  # pyright: ignore
+
+
+Params = Optional[dict[str, Any]]
+Description = Sequence[Sequence[Any]]
+Decode = Callable[["SelectQuery[Model]", Description], Callable[[Any], T]]
+
+
+def _decoder(query: SelectQuery[Model], description: Description) -> orm.RowDecoder[Model]:
+    return orm.row_decoder(query.model, description, partial=bool(query.deferred_fields))
+
+
+def _to_model(query: SelectQuery[Model], description: Description) -> Callable[[Any], Model]:
+    return _decoder(query, description).to_model
+
+
+def _to_dict(query: SelectQuery[Model], description: Description) -> Callable[[Any], dict[str, Any]]:
+    return _decoder(query, description).to_dict
+
+
+def _to_row(query: SelectQuery[Model], description: Description) -> Callable[[Any], Row[Model]]:
+    decoder = _decoder(query, description)
+    return lambda raw: Row(model=decoder.to_model(raw), extra=decoder.to_extra(raw))
+
+
+def _to_model_and_raw(query: SelectQuery[Model], description: Description) -> Callable[[Any], tuple[Model, Any]]:
+    to_model = _decoder(query, description).to_model
+    return lambda raw: (to_model(raw), raw)
+
+
+def _to_related_row(query: SelectQuery[Model], description: Description) -> Callable[[Any], Row[Model]]:
+    # with_related selects every model's fields in order, followed by the extra columns
+    slices: list[tuple[type[Any], slice]] = []
+    offset = 0
+    for model in [query.model, *query.joined_models]:
+        count = len(orm.model_fields(model))
+        slices.append((model, slice(offset, offset + count)))
+        offset += count
+
+    (model, model_slice), related_slices = slices[0], slices[1:]
+    extra_columns = [column[0] for column in description[offset:]]
+
+    def to_row(raw: Any) -> Row[Model]:
+        return Row(
+            model=model(*raw[model_slice]),
+            extra=dict(zip(extra_columns, raw[offset:])),
+            related={related: related(*raw[s]) for related, s in related_slices},
+        )
+
+    return to_row
+
+
+async def _iter_async(
+    db: AsyncConnection, start: Callable[[DbConnection], Generator[list[T], None, None]]
+) -> AsyncIterator[T]:
+    batches = await db.run(start)
+    try:
+        while (batch := await db.run(lambda _: next(batches, None))) is not None:
+            for item in batch:
+                yield item
+    finally:
+        await db.run(lambda _: batches.close())
+
+
+@dataclass
+class Prefetch:
+    """
+    A related model loaded by :meth:`SelectQuery.prefetch`.
+
+    :param source_key: Column of the queried model
+    :param target_key: Column of the related model, matching source_key
+    :param many: Whether each row relates to a list of instances, or at most one
+    """
+
+    model: type[Any]
+    source_key: str
+    target_key: str
+    many: bool
+
+    def attach(self, db: DbConnection, rows: list[Row[Any]]):
+        keys = {getattr(row.model, self.source_key) for row in rows}
+        keys.discard(None)
+
+        related: dict[Any, Any] = {}
+        table = orm.sql_table_name(self.model)
+        chunk_size = sqlite.variable_limit(db)
+        ordered_keys = list(keys)
+        for i in range(0, len(ordered_keys), chunk_size):
+            chunk = ordered_keys[i : i + chunk_size]
+            query = SelectQuery(self.model).where(f'"{table}".{self.target_key} IN :keys', keys=chunk)
+            for instance in query.iter_models(db):
+                key = getattr(instance, self.target_key)
+                if self.many:
+                    related.setdefault(key, []).append(instance)
                 else:
-                    extra[key] = value
-            rows.append(Row(model=self.model(**model_dict), extra=extra))
-        return rows
+                    related[key] = instance
 
-    def _to_model(self, row: tuple[Any, ...]) -> Model:
-        return self.model(*row[: self.model_field_count])
+        for row in rows:
+            key = getattr(row.model, self.source_key)
+            row.related[self.model] = related.get(key, [] if self.many else None)
+
+
+@dataclass
+class Page(Generic[Model]):
+    """
+    One page of :meth:`SelectQuery.paginate` results.
+
+    :param models: The models on this page
+    :param next: Opaque token for fetching the following page, None on the last page
+    """
+
+    models: list[Model]
+    next: Optional[str]
+
+
+def _encode_field_value(field: dc.Field[Any], value: Any) -> Any:
+    # Values that aren't of the adapter's python type, e.g. ones already in their sql representation, are bound as is
+    if isinstance(value, (list, tuple)):
+        return [_encode_field_value(field, item) for item in value]  # pyright: ignore
+    if isinstance(value, field.metadata["adapter"].python_type):
+        return orm.encode_value(field, value)
+    return value
+
+
+def _token_value(field: Optional[dc.Field[Any]], value: Any) -> Any:
+    # Store the sql representation, so the token round trips through json
+    # and compares against the column exactly like the stored value
+    if field is not None:
+        value = orm.encode_value(field, value)
+    adapter = orm.Context.ADAPTERS.get(type(value))
+    if adapter is not None:
+        value = adapter.adapt(value)
+    return value
+
+
+def _encode_page_token(columns: list[str], values: list[Any]) -> str:
+    payload = json.dumps({"key": columns, "after": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_page_token(token: str, columns: list[str]) -> tuple[Any, ...]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError as e:
+        raise ValueError("Invalid page token") from e
+    if payload.get("key") != columns:
+        raise ValueError(f"Page token was created for a different key: {payload.get('key')}")
+    return tuple(payload["after"])
+
+
+def load_deferred(db: DbConnection, instance: Any):
+    """
+    Load the deferred fields of a model instance loaded with :meth:`SelectQuery.defer` or :meth:`SelectQuery.only`.
+    The model needs a primary key, to find its row again.
+    """
+    model = type(instance)
+    pk_field = orm.primary_key(model)
+    if pk_field is None:
+        raise MissingPrimaryKeyError(f"{model} has no primary key")
+
+    deferred = [field.name for field in orm.model_fields(model) if getattr(instance, field.name) is orm.DEFERRED]
+    if not deferred:
+        return
+
+    table = orm.sql_table_name(model)
+    rows = instrument.fetchall(
+        db,
+        f'SELECT {",".join(deferred)} FROM "{table}" WHERE {pk_field.name} = ?',
+        (getattr(instance, pk_field.name),),
+    )
+    if not rows:
+        raise LookupError(f"{model.__name__} row no longer exists")
+    for name, value in zip(deferred, rows[0]):
+        setattr(instance, name, value)
 
 
 def select(model: type[Model]) -> SelectQuery[Model]:
@@ -166,24 +1017,28 @@ def select(model: type[Model]) -> SelectQuery[Model]:
 
 
 def upsert(
-    db: DbConnection, records: list[Model], *, update: list[str]
+    db: DbConnection, records: Iterable[Model], *, update: list[str]
 ):  # pyright: ignore
     """
     Insert records, on conflict, update fields but only specific ones
 
+    The records are streamed through a single prepared statement with executemany,
+    so any iterable or generator of records can be loaded without building the whole batch in memory.
+    The whole batch is applied atomically, inside a savepoint.
+
     :param db: A sqlite database connection
     :param records: Records to insert or update
     :param update: List of column names to update in case of conflict
     """
     # :param update: List of fields to update in the case of a conflict
-    if len(records) == 0:
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
         return
-    model = type(records[0])
+    model = type(first)
     table = orm.sql_table_name(model)
-    columns = [field.name for field in dc.fields(model)]
-    to_sql: Callable[[Model], str] = lambda row: to_sql_literal(
-        [getattr(row, col) for col in columns]
-    )
+    columns = [field.name for field in orm.model_fields(model)]
+    placeholders = ",".join("?" for _ in columns)
 
     on_conflict_clause = ""
     if len(update) > 0:
@@ -192,13 +1047,32 @@ def upsert(
             SET {','.join(f'{col}=excluded.{col}' for col in update)}
         """
 
-    db.execute(
-        f"""
-        INSERT INTO {table}({','.join(columns)})
-        VALUES {','.join(to_sql(row) for row in records)}
-        {on_conflict_clause}
-        """
-    )
+    to_params = orm.row_encoder(model)
+
+    instrument.execute(db, "SAVEPOINT ormlite_upsert")
+    try:
+        instrument.executemany(
+            db,
+            f"""
+            INSERT INTO {table}({','.join(columns)})
+            VALUES ({placeholders})
+            {on_conflict_clause}
+            """,
+            map(to_params, chain([first], records)),
+        )
+    except BaseException:
+        instrument.execute(db, "ROLLBACK TO ormlite_upsert")
+        instrument.execute(db, "RELEASE ormlite_upsert")
+        raise
+    instrument.execute(db, "RELEASE ormlite_upsert")
+    cache.notify_write(table)
+
+
+async def upsert_async(db: AsyncConnection, records: Iterable[Model], *, update: list[str]):
+    """
+    Async counterpart of :func:`upsert`, run on the connection's worker thread.
+    """
+    await db.run(lambda conn: upsert(conn, records, update=update))
 
 
 def get_fk_table(field: dc.Field[Any]) -> Optional[str]:
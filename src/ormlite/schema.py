@@ -0,0 +1,193 @@
+"""
+Introspection of a database's schema, through sqlite's table valued pragma functions,
+and the metadata table ormlite keeps its own bookkeeping in.
+
+Each kind of schema object is read with one query across every table,
+so reading the schema costs the same handful of statements however many tables there are.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from ormlite import instrument
+from ormlite.orm import DatabaseConnection
+
+# ormlite's own bookkeeping table, see :mod:`ormlite.migrate`
+METADATA_TABLE = "_ormlite"
+
+# Tables migrate leaves alone: sqlite's internal tables (sqlite_sequence, sqlite_stat1, ...) and ormlite's own
+_USER_TABLES = r"""
+    m.type = 'table'
+    AND m.name NOT LIKE 'sqlite\_%' ESCAPE '\'
+    AND m.name NOT LIKE '\_ormlite%' ESCAPE '\'
+"""
+
+
+@dataclass(frozen=True)
+class Column:
+    """
+    One row of ``PRAGMA table_xinfo``.
+
+    :param default: The default's sql text, as written in the table definition
+    :param pk: 1 based position in the primary key, 0 for columns outside of it
+    """
+
+    name: str
+    type: str
+    notnull: bool
+    default: Optional[str]
+    pk: int
+
+
+@dataclass(frozen=True)
+class ForeignKey:
+    """
+    One foreign key constraint, from ``PRAGMA foreign_key_list``.
+
+    :param to: Referenced columns. None entries reference the primary key implicitly
+    """
+
+    columns: tuple[str, ...]
+    table: str
+    to: tuple[Optional[str], ...]
+    on_update: str
+    on_delete: str
+
+
+@dataclass
+class TableSchema:
+    """
+    :param columns: Columns in table order, by name
+    :param indexes: Explicitly created indexes, by name, to their CREATE INDEX statement.
+        Indexes sqlite creates automatically for PRIMARY KEY and UNIQUE constraints are left out
+    """
+
+    name: str
+    sql: str
+    columns: dict[str, Column] = field(default_factory=dict)
+    indexes: dict[str, str] = field(default_factory=dict)
+    foreign_keys: frozenset[ForeignKey] = frozenset()
+
+    @property
+    def without_rowid(self) -> bool:
+        return self.sql.rstrip().upper().endswith("WITHOUT ROWID")
+
+
+def read_schema(db: DatabaseConnection) -> dict[str, TableSchema]:
+    """
+    The schema of every user table, by name.
+    """
+    tables = {
+        name: TableSchema(name=name, sql=sql)
+        for name, sql in instrument.execute(db, f"SELECT m.name, m.sql FROM sqlite_schema m WHERE {_USER_TABLES}")
+    }
+
+    columns = instrument.execute(
+        db,
+        f"""
+        SELECT m.name, p.name, p.type, p."notnull", p.dflt_value, p.pk
+        FROM sqlite_schema m, pragma_table_xinfo(m.name) p
+        WHERE {_USER_TABLES} AND p.hidden = 0
+        ORDER BY m.name, p.cid
+    """,
+    )
+    for table, name, sql_type, notnull, default, pk in columns:
+        tables[table].columns[name] = Column(name, sql_type, bool(notnull), default, pk)
+
+    indexes = instrument.execute(
+        db,
+        f"""
+        SELECT m.name, p.name, i.sql
+        FROM sqlite_schema m, pragma_index_list(m.name) p
+        JOIN sqlite_schema i ON i.type = 'index' AND i.name = p.name
+        WHERE {_USER_TABLES} AND p.origin = 'c'
+    """,
+    )
+    for table, name, sql in indexes:
+        tables[table].indexes[name] = sql
+
+    references: dict[tuple[str, int], list[tuple[str, str, Optional[str], str, str]]] = {}
+    foreign_keys = instrument.execute(
+        db,
+        f"""
+        SELECT m.name, p.id, p."table", p."from", p."to", p.on_update, p.on_delete
+        FROM sqlite_schema m, pragma_foreign_key_list(m.name) p
+        WHERE {_USER_TABLES}
+        ORDER BY m.name, p.id, p.seq
+    """,
+    )
+    for table, fk_id, target, source, to, on_update, on_delete in foreign_keys:
+        references.setdefault((table, fk_id), []).append((source, target, to, on_update, on_delete))
+    for (table, _), parts in references.items():
+        fk = ForeignKey(
+            columns=tuple(source for source, *_ in parts),
+            table=parts[0][1],
+            to=tuple(to for _, _, to, _, _ in parts),
+            on_update=parts[0][3],
+            on_delete=parts[0][4],
+        )
+        tables[table].foreign_keys = tables[table].foreign_keys | {fk}
+
+    return tables
+
+
+def schema_version(db: DatabaseConnection) -> int:
+    """
+    sqlite's counter of schema changes, incremented by every CREATE, DROP and ALTER.
+    """
+    (version,) = instrument.execute(db, "PRAGMA schema_version").fetchone()
+    return version
+
+
+def create_metadata_table(db: DatabaseConnection):
+    instrument.execute(
+        db, f'CREATE TABLE IF NOT EXISTS "{METADATA_TABLE}" (key TEXT PRIMARY KEY, value) WITHOUT ROWID'
+    )
+
+
+def read_metadata(db: DatabaseConnection, *keys: str) -> dict[str, Any]:
+    """
+    Values stored in the metadata table, for the keys that are set.
+    Returns an empty dict when the table doesn't exist yet.
+    """
+    if not metadata_table_exists(db):
+        return {}
+    placeholders = ",".join("?" for _ in keys)
+    cursor = instrument.execute(
+        db, f'SELECT key, value FROM "{METADATA_TABLE}" WHERE key IN ({placeholders})', keys
+    )
+    return dict(cursor.fetchall())
+
+
+def metadata_table_exists(db: DatabaseConnection) -> bool:
+    found = instrument.execute(
+        db, "SELECT 1 FROM sqlite_schema WHERE type = 'table' AND name = ?", (METADATA_TABLE,)
+    ).fetchone()
+    return found is not None
+
+
+def write_metadata(db: DatabaseConnection, values: dict[str, Any]):
+    for key, value in values.items():
+        instrument.execute(
+            db,
+            f'INSERT INTO "{METADATA_TABLE}" (key, value) VALUES (?, ?) ON CONFLICT DO UPDATE SET value = excluded.value',
+            (key, value),
+        )
+
+
+def delete_metadata(db: DatabaseConnection, key: str):
+    instrument.execute(db, f'DELETE FROM "{METADATA_TABLE}" WHERE key = ?', (key,))
+
+
+def read_metadata_prefix(db: DatabaseConnection, prefix: str) -> dict[str, Any]:
+    """
+    Every value stored under a key starting with the prefix.
+    """
+    if not metadata_table_exists(db):
+        return {}
+    cursor = instrument.execute(
+        db,
+        f"""SELECT key, value FROM "{METADATA_TABLE}" WHERE substr(key, 1, length(:prefix)) = :prefix ORDER BY key""",
+        {"prefix": prefix},
+    )
+    return dict(cursor.fetchall())
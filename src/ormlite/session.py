@@ -0,0 +1,117 @@
+from __future__ import annotations
+import dataclasses as dc
+from collections import OrderedDict
+from typing import Any, Optional, TypeVar
+from collections.abc import Iterable
+
+from ormlite import orm
+from ormlite.errors import MissingPrimaryKeyError
+from ormlite.orm import DatabaseConnection as DbConnection
+from ormlite.query import SelectQuery, select, upsert
+
+Model = TypeVar("Model")
+
+
+class Session:
+    """
+    Identity map of model instances, keyed by model and primary key.
+
+    Within a session, a row is represented by a single instance:
+    :meth:`get` serves cached instances without querying sqlite,
+    and :meth:`models` hands back the cached instance for rows it has seen before, refreshed with the row's current values.
+
+    The map is bounded, the least recently used instances are evicted first.
+    Writes through :meth:`upsert` evict the written rows. Writes made outside the session are not tracked,
+    use :meth:`invalidate` after those.
+    Models without a primary key are never cached.
+    Neither are partially loaded instances, from queries with deferred fields,
+    though those still refresh the loaded fields of their row's cached instance.
+    """
+
+    def __init__(self, db: DbConnection, *, max_size: int = 1024):
+        """
+        :param db: Connection used for loading and writing
+        :param max_size: Maximum number of cached instances
+        """
+        self.db = db
+        self.max_size = max_size
+        self._instances: OrderedDict[tuple[type, Any], Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._instances)
+
+    def get(self, model: type[Model], pk: Any) -> Optional[Model]:
+        """
+        Look up an instance by primary key, only querying sqlite on a cache miss.
+        """
+        key = (model, pk)
+        instance = self._instances.get(key)
+        if instance is not None:
+            self._instances.move_to_end(key)
+            return instance
+
+        pk_field = orm.primary_key(model)
+        if pk_field is None:
+            raise MissingPrimaryKeyError(f"{model} has no primary key")
+
+        instance = next(select(model).where(**{pk_field.name: pk}).iter_models(self.db), None)
+        if instance is None:
+            return None
+        return self._remember(instance, pk_field)
+
+    def models(self, query: SelectQuery[Model]) -> list[Model]:
+        """
+        Run the query, mapping each result onto the session's instance for that row.
+        """
+        pk_field = orm.primary_key(query.model)
+        if pk_field is None:
+            return query.models(self.db)
+        return [self._remember(instance, pk_field) for instance in query.iter_models(self.db)]
+
+    def upsert(self, records: Iterable[Model], *, update: list[str]):
+        """
+        :func:`ormlite.upsert` the records, and evict them from the session.
+        """
+        records = list(records)
+        upsert(self.db, records, update=update)
+        for record in records:
+            pk_field = orm.primary_key(type(record))
+            if pk_field is not None:
+                self._instances.pop((type(record), getattr(record, pk_field.name)), None)
+
+    def invalidate(self, model: Optional[type] = None, pk: Any = dc.MISSING):
+        """
+        Evict instances from the session.
+        With no arguments, everything is evicted. With a model, every instance of that model,
+        and with a model and primary key, just that instance.
+        """
+        if model is None:
+            self._instances.clear()
+        elif pk is not dc.MISSING:
+            self._instances.pop((model, pk), None)
+        else:
+            for key in [key for key in self._instances if key[0] is model]:
+                del self._instances[key]
+
+    def _remember(self, instance: Model, pk_field: dc.Field[Any]) -> Model:
+        pk = getattr(instance, pk_field.name)
+        if pk is orm.DEFERRED:
+            return instance
+        key = (type(instance), pk)
+        cached = self._instances.get(key)
+        fields = orm.model_fields(type(instance))
+        if cached is None:
+            # instances with deferred fields aren't cached, :meth:`get` only hands out fully loaded ones
+            if any(getattr(instance, field.name) is orm.DEFERRED for field in fields):
+                return instance
+            self._instances[key] = instance
+            if len(self._instances) > self.max_size:
+                self._instances.popitem(last=False)
+            return instance
+
+        for field in fields:
+            value = getattr(instance, field.name)
+            if value is not orm.DEFERRED:
+                setattr(cached, field.name, value)
+        self._instances.move_to_end(key)
+        return cached
@@ -1,18 +1,168 @@
+import re
 import sqlite3
+import threading
+from contextlib import contextmanager
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any, Optional
 
 
-def connect_to_sqlite(file_name: str) -> sqlite3.Connection:
+@dataclass
+class Settings:
+    """
+    Connection level pragmas, applied to every connection as it is opened.
+    Set any of them to None to keep sqlite's default.
+
+    :param journal_mode: WAL lets readers proceed concurrently with a writer
+    :param synchronous: NORMAL is safe from corruption in WAL mode, and avoids an fsync per transaction
+    :param busy_timeout: Milliseconds to wait on a locked database before raising "database is locked"
+    :param mmap_size: Bytes of the database file to memory map
+    :param cache_size: Page cache size. Negative values are in KiB, positive values are in pages
+    """
+
+    journal_mode: Optional[str] = "WAL"
+    synchronous: Optional[str] = "NORMAL"
+    busy_timeout: Optional[int] = 5000
+    mmap_size: Optional[int] = 256 * 1024 * 1024
+    cache_size: Optional[int] = -64 * 1024
+
+    def pragmas(self) -> list[str]:
+        return [
+            f"PRAGMA {name} = {value}"
+            for name, value in vars(self).items()
+            if value is not None
+        ]
+
+
+class Connection(sqlite3.Connection):
+    """
+    A plain sqlite3 connection, that can be weakly referenced,
+    so per connection state like :class:`ormlite.cache.QueryCache` results goes away with it.
+    """
+
+
+def connect_to_sqlite(
+    file_name: str,
+    settings: Optional[Settings] = None,
+    *,
+    check_same_thread: bool = True,
+) -> sqlite3.Connection:
     """
     Opens a new sqlite connection in Auto-commit mode.
 
     :param file_name: sqlite database file to open (or create if it doesn't exist yet).
         Use the special argument of ":memory:" to only hold the database in memory and skip writing to file.
+    :param settings: Optional pragmas to apply to the connection.
+    :param check_same_thread: Passed through to sqlite3.connect
 
     """
-    return sqlite3.connect(
+    db = sqlite3.connect(
         file_name,
         # auto-commit mode
         isolation_level=None,
         # required for adapters to work
         detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        check_same_thread=check_same_thread,
+        factory=Connection,
     )
+    if settings is not None:
+        for pragma in settings.pragmas():
+            db.execute(pragma)
+    return db
+
+
+# sqlite's compile time default for SQLITE_MAX_VARIABLE_NUMBER before version 3.32
+DEFAULT_VARIABLE_LIMIT = 999
+
+
+def variable_limit(db: Any) -> int:
+    """
+    The maximum number of parameters a single statement can bind on this connection.
+    """
+    getlimit = getattr(db, "getlimit", None)
+    if getlimit is None:
+        return DEFAULT_VARIABLE_LIMIT
+    return getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+
+
+READ_STATEMENT = re.compile(r"\s*(SELECT|EXPLAIN)\b", re.IGNORECASE)
+
+
+class ConnectionPool:
+    """
+    A pool of connections to one database file, which can be used anywhere a single connection is accepted.
+
+    Each thread gets its own read only connection, created on first use.
+    All other statements go through a single shared writer connection, guarded by a lock.
+    Once a thread opens a transaction on the writer, it keeps the writer to itself until the transaction ends,
+    and all its statements, reads included, go to the writer.
+    """
+
+    def __init__(self, file_name: str, settings: Optional[Settings] = None):
+        if file_name == ":memory:":
+            raise ValueError("In memory databases can't be shared between connections")
+
+        self.file_name = file_name
+        self.settings = settings or Settings()
+        self._writer = connect_to_sqlite(file_name, self.settings, check_same_thread=False)
+        self._writer_lock = threading.RLock()
+        self._transaction_owner: Optional[int] = None
+        self._local = threading.local()
+        self._readers: list[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    def getlimit(self, category: int, /) -> int:
+        return self._writer.getlimit(category)
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        The current thread's read only connection.
+        """
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = connect_to_sqlite(self.file_name, self.settings, check_same_thread=False)
+            db.execute("PRAGMA query_only = ON")
+            with self._readers_lock:
+                self._readers.append(db)
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Check out the writer connection, for exclusive use by the current thread.
+        """
+        with self._writer_lock:
+            try:
+                yield self._writer
+            finally:
+                self._track_transaction()
+
+    def execute(self, statement: str, parameters: Any = (), /) -> sqlite3.Cursor:
+        if self._transaction_owner != threading.get_ident() and READ_STATEMENT.match(statement):
+            return self.reader().execute(statement, parameters)
+
+        with self.writer() as db:
+            return db.execute(statement, parameters)
+
+    def executemany(self, statement: str, parameters: Iterable[Any], /) -> sqlite3.Cursor:
+        with self.writer() as db:
+            return db.executemany(statement, parameters)
+
+    def close(self) -> None:
+        with self._readers_lock:
+            for db in self._readers:
+                db.close()
+            self._readers.clear()
+        with self._writer_lock:
+            self._writer.close()
+
+    def _track_transaction(self):
+        # Called with the writer lock held.
+        # While a transaction is open, hold one extra acquisition of the lock for its owner.
+        if self._writer.in_transaction and self._transaction_owner is None:
+            self._writer_lock.acquire()
+            self._transaction_owner = threading.get_ident()
+        elif not self._writer.in_transaction and self._transaction_owner is not None:
+            self._transaction_owner = None
+            self._writer_lock.release()
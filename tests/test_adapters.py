@@ -0,0 +1,76 @@
+import pytest
+import sqlite3
+from datetime import datetime, date, timezone, timedelta
+from typing import Optional
+
+from ormlite import model, field, select, upsert, migrate, connect_to_sqlite
+from ormlite.adapters import EpochDateTimeAdapter, JulianDateAdapter, IntBoolAdapter
+
+from .utils import unregister_all_models
+
+
+def test_native_adapters_per_field():
+    @model("events")
+    class Event:
+        id: int = field(pk=True)
+        at: datetime = field(adapter=EpochDateTimeAdapter())
+        day: date = field(adapter=JulianDateAdapter())
+        done: bool = field(adapter=IntBoolAdapter())
+        seen: Optional[datetime] = None
+
+    records = [
+        Event(id=1, at=datetime(2020, 3, 3, 4, 5, 6, 789), day=date(2000, 1, 1), done=True),
+        Event(id=2, at=datetime(1960, 1, 1), day=date(1999, 12, 31), done=False, seen=datetime(2021, 1, 1)),
+    ]
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, records, update=[])
+
+    assert select(Event).models(db) == records
+    assert select(Event).where(at=datetime(1960, 1, 1)).models(db) == records[1:]
+    # placeholders named after a field use its adapter too, while values already encoded are bound as is
+    assert select(Event).where("at = :at", at=datetime(1960, 1, 1)).models(db) == records[1:]
+    assert select(Event).where("day IN :day", day=[date(2000, 1, 1), date(1990, 1, 1)]).models(db) == records[:1]
+    assert select(Event).where("at < :at", at=0).models(db) == records[1:]
+    # and so are call time values
+    assert select(Event).where("at > :at").compile().models(db, at=datetime(2000, 1, 1)) == records[:1]
+    assert db.execute("SELECT typeof(at), date(day), typeof(done), typeof(seen) FROM events WHERE id = 1").fetchone() == (
+        "integer",
+        "2000-01-01",
+        "integer",
+        "null",
+    )
+    unregister_all_models()
+
+
+def test_epoch_adapter_normalizes_timezones():
+    adapter = EpochDateTimeAdapter()
+    aware = datetime(2020, 1, 1, 5, tzinfo=timezone(timedelta(hours=5)))
+    assert adapter.convert(str(adapter.adapt(aware)).encode()) == datetime(2020, 1, 1)
+
+
+def test_int_bool_adapter_is_strict():
+    with pytest.raises(ValueError):
+        IntBoolAdapter().convert(b"3")
+
+
+def test_register_native_defaults():
+    from ormlite import adapters
+
+    adapters.register(native=True)
+    try:
+
+        @model("items")
+        class Item:
+            flag: bool
+            at: datetime
+
+        db = connect_to_sqlite(":memory:")
+        migrate(db)
+        upsert(db, [Item(flag=True, at=datetime(2022, 2, 2))], update=[])
+
+        assert select(Item).models(db) == [Item(flag=True, at=datetime(2022, 2, 2))]
+        assert db.execute("SELECT typeof(flag), typeof(at) FROM items").fetchone() == ("integer", "integer")
+    finally:
+        adapters.register()
+        unregister_all_models()
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+
+from ormlite import model, field, select, upsert_async, connect_async, migrate, Row
+from ormlite.aio import AsyncConnection
+
+from .utils import unregister_all_models
+
+
+def test_async_select_and_upsert(tmp_path):
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+        name: str
+
+    records = [Foo(id=i, name=str(i)) for i in range(10)]
+
+    async def main():
+        async with connect_async(str(tmp_path / "test.db")) as db:
+            await db.run(migrate)
+            await upsert_async(db, (record for record in records), update=[])
+
+            assert await select(Foo).where(id=3).models_async(db) == [records[3]]
+            assert await select(Foo).limit(1).rows_async(db) == [Row(records[0], extra={})]
+            assert await select(Foo).limit(1).dicts_async(db) == [{"id": 0, "name": "0"}]
+
+            streamed = [foo async for foo in select(Foo).iter_models_async(db, batch_size=3)]
+            assert streamed == records
+
+            # concurrent requests are all served by the one worker thread
+            results = await asyncio.gather(*(select(Foo).where(id=i).models_async(db) for i in range(10)))
+            assert results == [[record] for record in records]
+
+    asyncio.run(main())
+    unregister_all_models()
+
+
+def test_async_errors_propagate():
+    async def main():
+        db = connect_async(":memory:", max_pending=1)
+        with pytest.raises(Exception, match="no such table"):
+            await db.run(lambda conn: conn.execute("SELECT * FROM missing"))
+        await db.close()
+        with pytest.raises(RuntimeError):
+            await db.run(lambda conn: None)
+
+    asyncio.run(main())
+
+
+def test_async_connect_errors_propagate():
+    def connect():
+        raise ValueError("cannot connect")
+
+    async def main():
+        db = AsyncConnection(connect)
+        with pytest.raises(ValueError, match="cannot connect"):
+            await db.run(lambda conn: None)
+
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+import pytest
+from typing import Optional
+
+from ormlite import model, field, select, upsert, migrate, plan_migration, run_backfills, connect_to_sqlite
+from ormlite import instrument
+from ormlite.backfill import pending_backfills
+
+from .utils import unregister_all_models
+
+
+def test_backfill_sql_expression():
+    @model("persons")
+    class Person:
+        id: int = field(pk=True)
+        name: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Person(id=i, name=f"p{i}") for i in range(25)], update=[])
+
+    @model("persons")
+    class Person:
+        id: int = field(pk=True)
+        name: str
+        shout: Optional[str] = field(default=None, backfill="upper(name) || '!'")
+
+    assert [step.kind for step in plan_migration(db)] == ["add_column", "backfill"]
+    migrate(db)
+    assert pending_backfills(db) == [("persons", "shout")]
+    assert select(Person).where("shout IS NULL").count(db) == 25
+
+    transactions = []
+    hook = lambda event: transactions.append(event.sql) if event.sql.startswith("BEGIN") else None
+    instrument.add_hook(hook)
+    try:
+        assert run_backfills(db, chunk_size=10) == 25
+    finally:
+        instrument.remove_hook(hook)
+
+    # three chunks, and one more to find there's nothing left
+    assert len(transactions) == 4
+    assert select(Person).where(id=24).models(db) == [Person(id=24, name="p24", shout="P24!")]
+    assert select(Person).where("shout IS NULL").count(db) == 0
+    assert pending_backfills(db) == []
+    assert run_backfills(db) == 0
+
+    unregister_all_models()
+    db.close()
+
+
+def test_backfill_function_resumes():
+    @model("events")
+    class Event:
+        name: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Event(name=f"e{i}") for i in range(25)], update=[])
+
+    failing = True
+
+    def name_length(event):
+        if failing and event.name == "e15":
+            raise RuntimeError("interrupted")
+        return len(event.name)
+
+    @model("events")
+    class Event:
+        name: str
+        length: Optional[int] = field(default=None, backfill=name_length)
+
+    migrate(db)
+    with pytest.raises(RuntimeError):
+        run_backfills(db, chunk_size=10)
+    assert not db.in_transaction
+    assert select(Event).where("length IS NOT NULL").count(db) == 10
+
+    failing = False
+    assert run_backfills(db, chunk_size=10) == 15
+    assert select(Event).order_by("rowid").limit(3).aggregate(db, "name", "length") == [
+        ("e0", 2),
+        ("e1", 2),
+        ("e2", 2),
+    ]
+    assert select(Event).where("length IS NULL").count(db) == 0
+
+    unregister_all_models()
+    db.close()
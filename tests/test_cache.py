@@ -0,0 +1,97 @@
+import sqlite3
+import time
+
+from ormlite import model, field, select, upsert, migrate, connect_to_sqlite
+from ormlite import instrument
+from ormlite.cache import QueryCache
+
+from .utils import unregister_all_models
+
+
+def test_query_cache_invalidated_by_writes():
+    @model("colors")
+    class Color:
+        id: int = field(pk=True)
+        name: str
+
+    @model("tables")
+    class Table:
+        id: int = field(pk=True)
+        color_id: int = field(fk="colors.id")
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Color(1, "red"), Color(2, "blue")], update=[])
+    upsert(db, [Table(1, 1)], update=[])
+
+    cache = QueryCache()
+    events = []
+    instrument.add_hook(events.append)
+    try:
+        query = lambda: select(Table).join(Color).where(color_id=1).cache(cache)
+        assert query().models(db) == [Table(1, 1)]
+        assert query().models(db) == [Table(1, 1)]
+        assert len(events) == 1
+
+        # different parameters or result kinds are cached separately
+        assert select(Table).join(Color).where(color_id=2).cache(cache).models(db) == []
+        assert query().dicts(db) == [{"id": 1, "color_id": 1}]
+        assert len(events) == 3
+        assert len(cache) == 3
+
+        # writing to a joined table invalidates the query
+        upsert(db, [Color(1, "green")], update=["name"])
+        assert len(cache) == 0
+        events.clear()
+        query().models(db)
+        assert len(events) == 1
+    finally:
+        instrument.remove_hook(events.append)
+        unregister_all_models()
+
+
+def test_query_cache_bounds():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Foo(i) for i in range(3)], update=[])
+
+    cache = QueryCache(max_size=2, ttl=0.05)
+    for i in range(3):
+        select(Foo).where(id=i).cache(cache).models(db)
+    assert len(cache) == 2
+
+    db.execute("DELETE FROM foos WHERE id = 2")
+    assert select(Foo).where(id=2).cache(cache).models(db) == [Foo(2)]
+    time.sleep(0.06)
+    assert select(Foo).where(id=2).cache(cache).models(db) == []
+
+    cache.clear()
+    assert len(cache) == 0
+    unregister_all_models()
+
+
+def test_query_cache_per_connection():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+
+    cache = QueryCache()
+    for rows in range(1, 4):
+        # closed connections are collected, and their ids reused by the next one
+        db = connect_to_sqlite(":memory:")
+        db.execute("CREATE TABLE foos (id INTEGER PRIMARY KEY)")
+        db.executemany("INSERT INTO foos VALUES (?)", [(i,) for i in range(rows)])
+        assert select(Foo).cache(cache).models(db) == [Foo(i) for i in range(rows)]
+        db.close()
+        del db
+
+    # with their results dropped on the next lookup
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE foos (id INTEGER PRIMARY KEY)")
+    assert select(Foo).cache(cache).models(db) == []
+    assert len(cache) == 1
+    unregister_all_models()
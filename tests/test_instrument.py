@@ -0,0 +1,84 @@
+import logging
+
+from ormlite import model, field, select, upsert, migrate, connect_to_sqlite
+from ormlite import instrument
+
+from .utils import unregister_all_models
+
+
+def test_hooks_report_statements():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+        name: str = field(index=True)
+
+    events = []
+    instrument.add_hook(events.append)
+    try:
+        db = connect_to_sqlite(":memory:")
+        migrate(db)
+        assert any("CREATE TABLE" in event.sql for event in events)
+
+        events.clear()
+        upsert(db, [Foo(id=i, name=str(i)) for i in range(5)], update=[])
+        assert [(event.parameters, event.rows) for event in events if "INSERT" in event.sql] == [(None, 5)]
+
+        events.clear()
+        assert len(select(Foo).where(id=2).models(db)) == 1
+        (event,) = events
+        assert "SELECT" in event.sql
+        assert event.parameters == {"_id_0": 2}
+        assert event.rows == 1
+        assert event.elapsed >= 0
+
+        # reads that don't load models report the rows they fetched too
+        events.clear()
+        assert select(Foo).count(db) == 5
+        assert select(Foo).aggregate(db, "id") == [(i,) for i in range(5)]
+        assert len(select(Foo).columns(db, batch_size=2)["id"]) == 5
+        assert [event.rows for event in events] == [1, 5, 5]
+    finally:
+        instrument.remove_hook(events.append)
+        unregister_all_models()
+
+
+def test_explain():
+    @model("foos")
+    class Foo:
+        id: int
+        name: str = field(index=True)
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+
+    (step,) = select(Foo).where(name="a").explain(db)
+    assert step.full_scan_table is None
+    assert "USING INDEX ix_foos_name" in step.detail
+
+    (step,) = select(Foo).where(id=1).explain(db)
+    assert step.full_scan_table == "foos"
+
+    # older sqlite versions name the table differently
+    assert instrument.PlanStep(2, 0, "SCAN TABLE foos").full_scan_table == "foos"
+    assert instrument.PlanStep(2, 0, "SCAN TABLE foos USING INDEX ix_foos_name").full_scan_table is None
+    unregister_all_models()
+
+
+def test_warn_on_full_scan(caplog):
+    @model("foos")
+    class Foo:
+        id: int
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Foo(id=i) for i in range(10)], update=[])
+
+    instrument.warn_on_full_scan(10)
+    try:
+        with caplog.at_level(logging.WARNING):
+            select(Foo).where(id=1).models(db)
+    finally:
+        instrument.warn_on_full_scan(None)
+
+    assert "Full scan of foos (10 rows)" in caplog.text
+    unregister_all_models()
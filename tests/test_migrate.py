@@ -2,10 +2,13 @@ import sqlite3
 import pytest
 from typing import Optional
 from unittest import mock
-from datetime import datetime
+from datetime import date, datetime
 
-from ormlite import model, field, migrate, connect_to_sqlite
-from ormlite.migrate import parse_column_names
+from ormlite import model, field, migrate, plan_migration, connect_to_sqlite, Index
+from ormlite import instrument, select
+from ormlite.adapters import EpochDateTimeAdapter, JulianDateAdapter
+from ormlite.errors import UnsupportedTypeChangeError
+from ormlite.migrate import diff_schema, convert_column, TableDiff
 
 from .utils import unregister_all_models
 
@@ -15,14 +18,20 @@ def fetch_table_defs(db):
         """
         SELECT tbl_name, sql
         FROM sqlite_schema
-        WHERE type = 'table'
+        WHERE type = 'table' AND name != '_ormlite'
     """
     ).fetchall()
 
 
-def test_parse_column_names_failed_regex():
-    with pytest.raises(Exception, match="regex failed to parse"):
-        parse_column_names("Crit TABlE")
+def fetch_index_defs(db):
+    return db.execute(
+        """
+        SELECT name, sql
+        FROM sqlite_schema
+        WHERE type = 'index'
+        ORDER BY name
+    """
+    ).fetchall()
 
 
 def test_migrate_lifecycle():
@@ -65,7 +74,7 @@ def test_migrate_lifecycle():
     assert fetch_table_defs(db) == [
         (
             "persons",
-            'CREATE TABLE "persons" (age INTEGER NOT NULL, name TEXT NOT NULL, address TEXT, phone INTEGER, funny BOOLEAN NOT NULL, height REAL NOT NULL)',
+            'CREATE TABLE "persons" (age INTEGER NOT NULL, name TEXT NOT NULL, funny BOOLEAN NOT NULL, height REAL NOT NULL, address TEXT, phone INTEGER)',
         )
     ]
 
@@ -79,3 +88,323 @@ def test_migrate_lifecycle():
     assert fetch_table_defs(db) == []
 
     db.close()
+
+
+def test_migrate_indexes():
+    # Arrange
+    @model("orders")
+    class Order:
+        id: int = field(pk=True)
+        customer_id: int = field(index=True)
+        code: str = field(unique=True)
+        note: str = ""
+        deleted: bool = False
+
+        indexes = [
+            Index("customer_id", "note", where="NOT deleted"),
+            Index("lower(note)", name="ix_orders_note"),
+        ]
+
+    db = connect_to_sqlite(":memory:")
+
+    # Act
+    migrate(db)
+
+    # Assert
+    assert fetch_index_defs(db) == [
+        ("ix_orders_customer_id", 'CREATE INDEX "ix_orders_customer_id" ON "orders" (customer_id)'),
+        (
+            "ix_orders_customer_id_note",
+            'CREATE INDEX "ix_orders_customer_id_note" ON "orders" (customer_id, note) WHERE NOT deleted',
+        ),
+        ("ix_orders_note", 'CREATE INDEX "ix_orders_note" ON "orders" (lower(note))'),
+        ("ux_orders_code", 'CREATE UNIQUE INDEX "ux_orders_code" ON "orders" (code)'),
+    ]
+    plan = db.execute("EXPLAIN QUERY PLAN SELECT * FROM orders WHERE customer_id = 1").fetchall()
+    assert "USING INDEX ix_orders_customer_id" in plan[0][3]
+
+    # Arrange: drop a column that's indexed, change an index, add a new indexed column
+    @model("orders")
+    class Order:
+        id: int = field(pk=True)
+        customer_id: int
+        code: str = field(unique=True)
+        placed_at: int = field(default=0, index=True)
+
+        indexes = [Index("lower(code)", name="ix_orders_note")]
+
+    # Act
+    migrate(db)
+
+    # Assert
+    assert fetch_index_defs(db) == [
+        ("ix_orders_note", 'CREATE INDEX "ix_orders_note" ON "orders" (lower(code))'),
+        ("ix_orders_placed_at", 'CREATE INDEX "ix_orders_placed_at" ON "orders" (placed_at)'),
+        ("ux_orders_code", 'CREATE UNIQUE INDEX "ux_orders_code" ON "orders" (code)'),
+    ]
+
+    unregister_all_models()
+    db.close()
+
+
+def test_migrate_skips_unchanged_schema():
+    @model("persons")
+    class Person:
+        id: int = field(pk=True)
+        name: str = field(index=True)
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+
+    statements = []
+    hook = lambda event: statements.append(event.sql)
+    instrument.add_hook(hook)
+    try:
+        migrate(db)
+        assert not any("BEGIN" in sql for sql in statements)
+
+        # schema changes made outside of migrate are picked up
+        db.execute('DROP INDEX "ix_persons_name"')
+        statements.clear()
+        migrate(db)
+        assert any("CREATE INDEX" in sql for sql in statements)
+    finally:
+        instrument.remove_hook(hook)
+
+    assert [name for (name,) in db.execute("SELECT name FROM sqlite_schema WHERE type = 'index' AND sql IS NOT NULL")] == [
+        "ix_persons_name"
+    ]
+    unregister_all_models()
+    db.close()
+
+
+def test_diff_schema():
+    @model("persons")
+    class Person:
+        id: int = field(pk=True)
+        name: str = field(index=True)
+        age: int = 0
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    db.execute("ANALYZE")
+
+    @model("persons")
+    class Person:
+        id: int = field(pk=True)
+        name: Optional[str]
+        age: int = 1
+        email: str = ""
+
+    @model("pets")
+    class Pet:
+        id: int = field(pk=True)
+        owner_id: int = field(fk="persons.id")
+
+    diff = diff_schema(db)
+    assert diff.create_tables == [Pet]
+    # sqlite's own tables, like sqlite_stat1 from ANALYZE, are left alone
+    assert diff.drop_tables == []
+    assert diff.alter_tables == [
+        TableDiff(
+            "persons",
+            add_columns=["email TEXT DEFAULT '' NOT NULL"],
+            copy_columns=["id", "name", "age"],
+            changed_columns=["name", "age"],
+            drop_indexes=["ix_persons_name"],
+        )
+    ]
+    unregister_all_models()
+    db.close()
+
+
+def test_migrate_rebuilds_table_once():
+    @model("owners")
+    class Owner:
+        id: int = field(pk=True)
+
+    @model("pets")
+    class Pet:
+        id: int = field(pk=True)
+        owner_id: int = field(fk="owners.id")
+        name: str = field(index=True)
+        weight: int
+        legs: int = 4
+        color: str = ""
+
+    db = connect_to_sqlite(":memory:")
+    db.execute("PRAGMA foreign_keys = ON")
+    migrate(db)
+    db.execute("INSERT INTO owners VALUES (1)")
+    db.execute("INSERT INTO pets VALUES (1, 1, 'rex', 30, 4, 'brown')")
+
+    # change a type and a default, drop two columns, add one
+    @model("pets")
+    class Pet:
+        id: int = field(pk=True)
+        owner_id: int = field(fk="owners.id")
+        name: str = field(index=True)
+        weight: float
+        nickname: Optional[str] = None
+
+    statements = []
+    hook = lambda event: statements.append(" ".join(event.sql.split()))
+    instrument.add_hook(hook)
+    try:
+        migrate(db)
+    finally:
+        instrument.remove_hook(hook)
+
+    copies = [sql for sql in statements if sql.startswith("INSERT INTO \"_ormlite_new_pets\"")]
+    assert copies == ['INSERT INTO "_ormlite_new_pets" (id,owner_id,name,weight) SELECT id,owner_id,name,weight FROM "pets"']
+    assert not any("DROP COLUMN" in sql for sql in statements)
+
+    assert fetch_table_defs(db) == [
+        ("owners", 'CREATE TABLE "owners" (id INTEGER PRIMARY KEY) WITHOUT ROWID'),
+        (
+            "pets",
+            'CREATE TABLE "pets" (id INTEGER PRIMARY KEY, owner_id INTEGER NOT NULL, name TEXT NOT NULL, weight REAL NOT NULL, nickname TEXT, FOREIGN KEY (owner_id) REFERENCES owners(id)) WITHOUT ROWID',
+        ),
+    ]
+    assert fetch_index_defs(db) == [("ix_pets_name", 'CREATE INDEX "ix_pets_name" ON "pets" (name)')]
+    assert db.execute("SELECT * FROM pets").fetchall() == [(1, 1, "rex", 30.0, None)]
+    assert db.execute("PRAGMA foreign_keys").fetchone() == (1,)
+    assert diff_schema(db).empty
+
+    unregister_all_models()
+    db.close()
+
+
+def test_migrate_converts_changed_types():
+    @model("logs")
+    class Log:
+        id: int = field(pk=True)
+        at: Optional[datetime]
+        day: date
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    rows = [
+        Log(1, datetime(2020, 1, 1), date(2020, 1, 1)),
+        Log(2, datetime(1969, 12, 31, 23, 59, 59, 500), date(1969, 12, 31)),
+        Log(3, None, date(2000, 2, 29)),
+        # strftime rounds to milliseconds, which mustn't carry into the seconds
+        Log(4, datetime(2020, 1, 1, 0, 0, 0, 999999), date(2020, 1, 1)),
+        Log(5, datetime(1969, 12, 31, 23, 59, 59, 999999), date(1969, 12, 31)),
+    ]
+    db.executemany("INSERT INTO logs VALUES (?, ?, ?)", [(log.id, log.at, log.day) for log in rows])
+
+    @model("logs")
+    class Log:
+        id: int = field(pk=True)
+        at: Optional[datetime] = field(adapter=EpochDateTimeAdapter())
+        day: date = field(adapter=JulianDateAdapter())
+
+    # timezone suffixes of aware datetimes are kept, and the value normalized to utc
+    convert = convert_column("logs", "at", "TIMESTAMP", "TIMESTAMP_INT")
+    aware = "2020-01-01T02:00:00.999999+02:00"
+    assert db.execute(f"SELECT {convert} FROM (SELECT ? AS at)", (aware,)).fetchone() == (1577836800999999,)
+
+    (step,) = plan_migration(db)
+    assert "types changed: {'at': 'TIMESTAMP -> TIMESTAMP_INT', 'day': 'DATE -> DATE_INT'}" in step.description
+    migrate(db)
+    assert select(Log).models(db) == [Log(log.id, log.at, log.day) for log in rows]
+
+    # and back to text
+    @model("logs")
+    class Log:
+        id: int = field(pk=True)
+        at: Optional[datetime]
+        day: date
+
+    migrate(db)
+    assert select(Log).models(db) == [Log(log.id, log.at, log.day) for log in rows]
+    assert db.execute("SELECT CAST(at AS TEXT) FROM logs WHERE id = 2").fetchone() == ("1969-12-31T23:59:59.000500",)
+
+    # a type change without a known conversion is rejected before anything runs
+    @model("logs")
+    class Log:
+        id: int = field(pk=True)
+        at: Optional[datetime]
+        day: int
+
+    with pytest.raises(UnsupportedTypeChangeError):
+        plan_migration(db)
+    with pytest.raises(UnsupportedTypeChangeError):
+        migrate(db)
+    assert db.execute("SELECT day FROM logs").fetchall() == [(log.day,) for log in rows]
+
+    unregister_all_models()
+    db.close()
+
+
+def test_migrate_rebuild_keeps_rowids():
+    @model("notes")
+    class Note:
+        text: str
+        draft: int = 0
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    db.executemany("INSERT INTO notes (text) VALUES (?)", [(f"n{i}",) for i in range(6)])
+    db.execute("DELETE FROM notes WHERE rowid <= 3")
+
+    @model("notes")
+    class Note:
+        text: str
+
+    migrate(db)
+    assert db.execute("SELECT rowid, text FROM notes").fetchall() == [(4, "n3"), (5, "n4"), (6, "n5")]
+    unregister_all_models()
+    db.close()
+
+
+def test_plan_migration():
+    @model("persons")
+    class Person:
+        id: int = field(pk=True)
+        name: str = field(index=True)
+        age: int = 0
+
+    @model("notes")
+    class Note:
+        text: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    db.executemany("INSERT INTO persons VALUES (?, ?, ?)", [(i, f"p{i}", i) for i in range(500)])
+    db.executemany("INSERT INTO notes VALUES (?)", [("note",)] * 10)
+    db.execute("ANALYZE")
+
+    # drop notes, change persons, add pets
+    unregister_all_models()
+
+    @model("persons")
+    class Person:
+        id: int = field(pk=True)
+        name: str
+        age: float = 0
+        email: str = ""
+
+    @model("pets")
+    class Pet:
+        id: int = field(pk=True)
+        owner_id: int = field(fk="persons.id", index=True)
+
+    schema_before = fetch_table_defs(db)
+    plan = plan_migration(db)
+    assert fetch_table_defs(db) == schema_before
+
+    assert [(step.kind, step.table, step.rows) for step in plan] == [
+        ("create_table", "pets", 0),
+        ("create_index", "pets", 0),
+        ("drop_table", "notes", 10),
+        ("rebuild_table", "persons", 500),
+    ]
+    assert plan[0].pages == plan[1].pages == 0
+    assert plan[3].pages > 1
+
+    migrate(db)
+    assert plan_migration(db) == []
+    unregister_all_models()
+    db.close()
@@ -0,0 +1,85 @@
+import pytest
+from concurrent.futures import Future
+from unittest import mock
+
+from ormlite import model, field, select, upsert, migrate, connect_to_sqlite
+from ormlite.orm import DEFERRED
+from ormlite import parallel
+from ormlite.parallel import key_ranges, default_shards
+
+from .utils import unregister_all_models
+
+
+def test_key_ranges():
+    assert key_ranges(1, 10, 3) == [(1, 4), (5, 8), (9, 10)]
+    assert key_ranges(5, 5, 4) == [(5, 5)]
+    assert key_ranges(1, 2, 8) == [(1, 1), (2, 2)]
+
+    assert default_shards(1, 100, 2) == 8
+    assert default_shards(1, 1_000_000, 2) == 100
+
+
+class InlinePool:
+    def __init__(self, max_workers: int):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, cancel_futures: bool):
+        pass
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_iter_shards_bounds_in_flight(ordered):
+    pulled = []
+
+    def shards():
+        for i in range(10):
+            pulled.append(i)
+            yield i
+
+    read_shard = lambda file_name, settings, shard, params: [shard]
+    with mock.patch.object(parallel, "ProcessPoolExecutor", InlinePool), mock.patch.object(
+        parallel, "_read_shard", read_shard
+    ):
+        models = parallel.iter_shards("test.db", None, shards(), {}, workers=2, ordered=ordered)
+        first = next(models)
+        # two per worker up front, then one more as each shard is yielded
+        assert len(pulled) == 5
+        assert sorted([first, *models]) == list(range(10))
+
+
+def test_iter_models_parallel(tmp_path):
+    @model("readings")
+    class Reading:
+        id: int = field(pk=True)
+        value: float
+        note: str
+
+    # worker processes unpickle the models by reference, so the class has to be importable
+    Reading.__qualname__ = "Reading"
+    globals()["Reading"] = Reading
+
+    file_name = str(tmp_path / "test.db")
+    db = connect_to_sqlite(file_name)
+    migrate(db)
+    readings = [Reading(id=i, value=i / 2, note=f"n{i}") for i in range(1, 101)]
+    upsert(db, readings, update=[])
+
+    query = select(Reading)
+    assert list(query.iter_models_parallel(file_name, workers=2, shards=7)) == readings
+
+    unordered = select(Reading).where("value > :min").iter_models_parallel(file_name, workers=2, ordered=False, min=40)
+    assert sorted(unordered, key=lambda reading: reading.id) == readings[80:]
+
+    deferred = list(select(Reading).defer("note").where(id=3).iter_models_parallel(file_name, workers=1))
+    assert deferred[0].note is DEFERRED
+
+    with pytest.raises(ValueError):
+        list(select(Reading).limit(3).iter_models_parallel(file_name))
+
+    del globals()["Reading"]
+    unregister_all_models()
@@ -5,6 +5,7 @@ from unittest import mock
 from datetime import datetime, date
 
 from ormlite import model, field, select, upsert, migrate, connect_to_sqlite, Row
+from ormlite.errors import InvalidJoinError
 
 from .utils import unregister_all_models
 
@@ -243,3 +244,458 @@ def test_datetime_columns():
     unregister_all_models()
 
 
+def test_where_clause__bound_parameters():
+    @model("foos")
+    class Foo:
+        a: int
+        b: str
+
+    records = [
+        Foo(a=1, b="first"),
+        Foo(a=2, b="x"),
+        Foo(a=3, b="y"),
+    ]
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, records, update=[])
+
+    first = select(Foo).where(b="first")
+    second = select(Foo).where(b="x")
+    assert first.where_clause == second.where_clause
+    assert first.models(db) == records[:1]
+    assert second.models(db) == records[1:2]
+
+    assert select(Foo).where("a IN :values", values=[1, 3]).models(db) == [records[0], records[2]]
+    assert select(Foo).where("a > :v", v=1).where("a < :v", v=3).models(db) == records[1:2]
+    unregister_all_models()
+
+
+def test_upsert_generator():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+        name: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, (Foo(id=i, name=f"O'Brien {i}") for i in range(1000)), update=[])
+
+    assert select(Foo).where(id=999).models(db) == [Foo(id=999, name="O'Brien 999")]
+    assert len(select(Foo).models(db)) == 1000
+    unregister_all_models()
+
+
+def test_upsert_is_atomic():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    with pytest.raises(sqlite3.IntegrityError):
+        upsert(db, [Foo(id=1), Foo(id=2), Foo(id=1)], update=[])
+
+    assert select(Foo).models(db) == []
+    assert not db.in_transaction
+    unregister_all_models()
+
+
+def test_select_iterators_stream_in_batches():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+        name: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    records = [Foo(id=i, name=str(i)) for i in range(10)]
+    upsert(db, records, update=[])
+
+    models = select(Foo).iter_models(db, batch_size=3)
+    assert next(models) == records[0]
+    assert list(models) == records[1:]
+
+    assert list(select(Foo).extra("id * 2 AS double").iter_rows(db, batch_size=4)) == [
+        Row(record, extra={"double": record.id * 2}) for record in records
+    ]
+    assert list(select(Foo).iter_dicts(db, batch_size=20)) == [
+        {"id": record.id, "name": record.name} for record in records
+    ]
+    unregister_all_models()
+
+
+def test_select_decodes_by_column_name():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+
+    # migrate appends the new column, after the existing ones
+    @model("foos")
+    class Foo:
+        name: str = ""
+        id: int = field(pk=True, default=0)
+
+    migrate(db)
+    upsert(db, [Foo(name="a", id=1)], update=[])
+
+    assert select(Foo).models(db) == [Foo(name="a", id=1)]
+    assert select(Foo).extra("id + 1 AS next").rows(db) == [Row(Foo(name="a", id=1), extra={"next": 2})]
+    unregister_all_models()
+
+
+def test_select__multiple_joins_with_related():
+    @model("customers")
+    class Customer:
+        id: int = field(pk=True)
+        name: str
+
+    @model("products")
+    class Product:
+        id: int = field(pk=True)
+        title: str
+
+    @model("orders")
+    class Order:
+        id: int = field(pk=True)
+        customer_id: int = field(fk="customers.id")
+        product_id: int = field(fk="products.id")
+
+    @model("shipments")
+    class Shipment:
+        order_id: int = field(fk="orders.id")
+        carrier: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    alice, bob = Customer(1, "alice"), Customer(2, "bob")
+    chair, desk = Product(1, "chair"), Product(2, "desk")
+    orders = [Order(1, 1, 2), Order(2, 2, 1)]
+    shipment = Shipment(order_id=2, carrier="post")
+    upsert(db, [alice, bob], update=[])
+    upsert(db, [chair, desk], update=[])
+    upsert(db, orders, update=[])
+    upsert(db, [shipment], update=[])
+
+    query = select(Order).join(Customer).join(Product).extra("customers.name || ':' || products.title AS label")
+    assert query.models_with_related(db) == [
+        Row(orders[0], extra={"label": "alice:desk"}, related={Customer: alice, Product: desk}),
+        Row(orders[1], extra={"label": "bob:chair"}, related={Customer: bob, Product: chair}),
+    ]
+
+    # reverse join, from the referenced table to the one holding the foreign key
+    assert select(Customer).join(Order).join(Shipment).models_with_related(db) == [
+        Row(bob, extra={}, related={Order: orders[1], Shipment: shipment}),
+    ]
+
+    with pytest.raises(InvalidJoinError):
+        select(Customer).join(Product)
+    with pytest.raises(InvalidJoinError):
+        select(Order).join(Customer).join(Customer)
+    unregister_all_models()
+
+
+def test_select__prefetch():
+    @model("customers")
+    class Customer:
+        id: int = field(pk=True)
+        name: str
+
+    @model("orders")
+    class Order:
+        id: int = field(pk=True)
+        customer_id: Optional[int] = field(fk="customers.id", default=None)
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    customers = [Customer(i, f"c{i}") for i in range(3)]
+    orders = [Order(i, i % 2) for i in range(5)] + [Order(5)]
+    upsert(db, customers, update=[])
+    upsert(db, orders, update=[])
+
+    # force the related keys to be loaded in several chunks
+    db.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 1)
+
+    # batches smaller than the result check that each batch is prefetched
+    rows = list(select(Order).prefetch(Customer).iter_rows(db, batch_size=4))
+    assert [row.related[Customer] for row in rows] == [customers[i % 2] for i in range(5)] + [None]
+
+    rows = select(Customer).prefetch(Order).rows(db)
+    assert [row.related[Order] for row in rows] == [
+        [orders[0], orders[2], orders[4]],
+        [orders[1], orders[3]],
+        [],
+    ]
+
+    # the source keys are loaded even when deferred
+    rows = select(Order).only("id").prefetch(Customer).rows(db)
+    assert [row.related[Customer] for row in rows] == [customers[i % 2] for i in range(5)] + [None]
+    rows = select(Customer).only("name").prefetch(Order).rows(db)
+    assert [len(row.related[Order]) for row in rows] == [3, 2, 0]
+    unregister_all_models()
+
+
+def test_compiled_query():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+        age: int
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    records = [Foo(id=i, age=i * 10) for i in range(5)]
+    upsert(db, records, update=[])
+
+    query = select(Foo).where("age > :age").where("id < :max_id", max_id=4).order_by("id").compile()
+    assert query.models(db, age=15) == records[2:4]
+    assert query.models(db, age=25) == records[3:4]
+    assert list(query.iter_dicts(db, batch_size=1, age=0)) == [{"id": i, "age": i * 10} for i in range(1, 4)]
+    assert query.compile() is query
+
+    # unbound placeholders can be filled in on plain queries too
+    assert select(Foo).where("id = :id").models(db, id=2) == records[2:3]
+
+    # lists can only be bound before the sql is built
+    assert select(Foo).where("id IN :ids", ids=[1, 2]).compile().models(db) == records[1:3]
+    with pytest.raises(ValueError, match=":ids"):
+        select(Foo).where("id IN :ids").compile().models(db, ids=[1, 2])
+
+    with pytest.raises(TypeError):
+        query.where(id=1)
+    unregister_all_models()
+
+
+def test_paginate():
+    @model("events")
+    class Event:
+        id: int = field(pk=True)
+        day: date = field(index=True)
+        kind: str = "a"
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    records = [Event(id=i, day=date(2020, 1, 10 - i % 3), kind="ab"[i % 2]) for i in range(10)]
+    upsert(db, records, update=[])
+
+    # default key: the primary key
+    pages = []
+    token = None
+    while True:
+        page = select(Event).where(kind="a").paginate(db, size=2, after=token)
+        pages.append([event.id for event in page.models])
+        token = page.next
+        if token is None:
+            break
+    assert pages == [[0, 2], [4, 6], [8]]
+
+    # index key, with the primary key as a tie breaker
+    first = select(Event).paginate(db, size=4, key=["day"])
+    second = select(Event).paginate(db, size=4, key=["day"], after=first.next)
+    by_day = sorted(records, key=lambda event: (event.day, event.id))
+    assert first.models == by_day[:4]
+    assert second.models == by_day[4:8]
+
+    with pytest.raises(ValueError):
+        select(Event).paginate(db, size=4, after=first.next)
+    unregister_all_models()
+
+
+def test_paginate_rowid():
+    @model("foos")
+    class Foo:
+        name: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Foo(str(i)) for i in range(5)], update=[])
+
+    first = select(Foo).paginate(db, size=3)
+    second = select(Foo).paginate(db, size=3, after=first.next)
+    assert [foo.name for foo in first.models + second.models] == [str(i) for i in range(5)]
+    assert second.next is None
+    unregister_all_models()
+
+
+def test_select_only_and_defer():
+    from ormlite.orm import DEFERRED
+    from ormlite.query import load_deferred
+
+    @model("documents")
+    class Document:
+        id: int = field(pk=True)
+        title: str
+        body: bytes
+        created: date = date(2020, 1, 1)
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Document(1, "a", b"x" * 100), Document(2, "b", b"y")], update=[])
+
+    (first, second) = select(Document).defer("body").models(db)
+    assert (first.id, first.title, first.created) == (1, "a", date(2020, 1, 1))
+    assert first.body is DEFERRED
+    assert "body" not in select(Document).defer("body")._sql()
+
+    assert select(Document).only("id", "title").dicts(db) == [{"id": 1, "title": "a"}, {"id": 2, "title": "b"}]
+    (row,) = select(Document).only("title").where(id=2).extra("length(body) AS size").rows(db)
+    assert (row.model.title, row.model.id, row.extra) == ("b", DEFERRED, {"size": 1})
+
+    load_deferred(db, second)
+    assert second == Document(2, "b", b"y")
+
+    with pytest.raises(ValueError):
+        select(Document).only("missing")
+    unregister_all_models()
+
+
+def test_count_exists_and_aggregate():
+    @model("customers")
+    class Customer:
+        id: int = field(pk=True)
+        name: str
+
+    @model("orders")
+    class Order:
+        id: int = field(pk=True)
+        customer_id: int = field(fk="customers.id")
+        total: float
+        paid: bool
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Customer(1, "ada"), Customer(2, "bob")], update=[])
+    upsert(
+        db,
+        [
+            Order(1, customer_id=1, total=10.0, paid=True),
+            Order(2, customer_id=1, total=5.0, paid=False),
+            Order(3, customer_id=2, total=7.5, paid=True),
+        ],
+        update=[],
+    )
+
+    assert select(Order).count(db) == 3
+    assert select(Order).where(paid=True).count(db) == 2
+    assert select(Order).join(Customer).where("customers.name = :name", name="ada").count(db) == 2
+    assert select(Order).limit(2).count(db) == 2
+    assert select(Order).group_by("customer_id").count(db) == 2
+
+    assert select(Order).where(customer_id=2).exists(db)
+    assert not select(Order).where(customer_id=3).exists(db)
+
+    assert select(Order).where(paid=True).scalar(db, "SUM(total)") == 17.5
+    assert select(Order).where(customer_id=3).scalar(db, "MAX(total)") is None
+    assert select(Order).order_by("total DESC").limit(2).scalar(db, "SUM(total)") == 17.5
+    assert select(Order).aggregate(db, "COUNT(*)", "MIN(total)", "MAX(total)") == [(3, 5.0, 10.0)]
+
+    totals = (
+        select(Order)
+        .join(Customer)
+        .group_by("customers.name")
+        .having("COUNT(*) > :n", n=1)
+        .order_by("customers.name")
+        .aggregate(db, "customers.name", "SUM(orders.total)")
+    )
+    assert totals == [("ada", 15.0)]
+
+    compiled = select(Order).where("total > :min").compile()
+    assert compiled.count(db, min=6) == 2
+    with pytest.raises(TypeError):
+        compiled.group_by("paid")
+    unregister_all_models()
+
+
+def test_update_and_delete():
+    @model("customers")
+    class Customer:
+        id: int = field(pk=True)
+        name: str
+
+    @model("orders")
+    class Order:
+        id: int = field(pk=True)
+        customer_id: int = field(fk="customers.id")
+        placed_on: date
+        paid: bool
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Customer(1, "ada"), Customer(2, "bob")], update=[])
+    upsert(
+        db,
+        [
+            Order(1, customer_id=1, placed_on=date(2023, 1, 1), paid=False),
+            Order(2, customer_id=1, placed_on=date(2023, 1, 2), paid=False),
+            Order(3, customer_id=2, placed_on=date(2023, 1, 3), paid=False),
+        ],
+        update=[],
+    )
+
+    assert select(Order).where(id=1).update(db, paid=True, placed_on=date(2024, 5, 5)) == 1
+    assert select(Order).where(id=1).models(db) == [Order(1, customer_id=1, placed_on=date(2024, 5, 5), paid=True)]
+
+    assert select(Order).join(Customer).where("customers.name = :name", name="bob").update(db, paid=True) == 1
+    assert select(Order).where(paid=True).count(db) == 2
+
+    # the new values don't clobber where values, whatever their names
+    query = select(Order).where("customer_id = :set", set=2)
+    assert query.update(db, customer_id=1) == 1
+    assert query.params == {"_set_0": 2}
+    assert select(Order).where(customer_id=1).count(db) == 3
+
+    assert select(Order).order_by("id DESC").limit(1).delete(db) == 1
+    assert [order.id for order in select(Order).models(db)] == [1, 2]
+
+    assert select(Order).where("placed_on < :cutoff").delete(db, cutoff=date(2024, 1, 1)) == 1
+    assert [order.id for order in select(Order).models(db)] == [1]
+
+    with pytest.raises(ValueError):
+        select(Order).update(db, missing=1)
+    unregister_all_models()
+
+
+def test_columns():
+    from ormlite import columnar
+
+    @model("readings")
+    class Reading:
+        id: int = field(pk=True)
+        value: Optional[float]
+        valid: Optional[bool]
+        taken_at: datetime
+        sensor: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    readings = [
+        Reading(1, value=1.5, valid=True, taken_at=datetime(1970, 1, 1, 0, 0, 1), sensor="a"),
+        Reading(2, value=None, valid=False, taken_at=datetime(1970, 1, 2), sensor="b"),
+        Reading(3, value=-2.0, valid=True, taken_at=datetime(2000, 1, 1, 0, 0, 0, 5), sensor="a"),
+    ]
+    upsert(db, readings, update=[])
+
+    columns = select(Reading).order_by("id").extra("upper(sensor) AS upper").columns(db, batch_size=2)
+    assert list(columns) == ["id", "value", "valid", "taken_at", "sensor", "upper"]
+    assert list(columns["id"]) == [1, 2, 3]
+    assert [value == value for value in columns["value"]] == [True, False, True]
+    assert list(columns["valid"]) == [True, False, True]
+    assert list(columns["sensor"]) == ["a", "b", "a"]
+    assert list(columns["upper"]) == ["A", "B", "A"]
+
+    micros = [1_000_000, 86_400_000_000, 946_684_800_000_005]
+    if columnar.np is None:
+        assert columns["id"].typecode == "q"
+        assert list(columns["taken_at"]) == micros
+    else:
+        assert str(columns["taken_at"].dtype) == "datetime64[us]"
+        assert columns["taken_at"].astype("int64").tolist() == micros
+
+    only = select(Reading).only("id").where("value IS NULL").columns(db)
+    assert {name: list(values) for name, values in only.items()} == {"id": [2]}
+
+    select(Reading).where(id=1).update(db, valid=None)
+    with pytest.raises(ValueError):
+        select(Reading).columns(db)
+    unregister_all_models()
@@ -0,0 +1,104 @@
+import pytest
+
+from ormlite import model, field, select, upsert, migrate, connect_to_sqlite, Session
+from ormlite.errors import MissingPrimaryKeyError
+from ormlite.orm import DEFERRED
+from ormlite import instrument
+
+from .utils import unregister_all_models
+
+
+def test_session_identity_map():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+        name: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Foo(id=i, name=str(i)) for i in range(5)], update=[])
+
+    events = []
+    instrument.add_hook(events.append)
+    try:
+        session = Session(db, max_size=3)
+        first = session.get(Foo, 1)
+        assert first == Foo(1, "1")
+        assert session.get(Foo, 1) is first
+        assert len(events) == 1
+        assert session.get(Foo, 99) is None
+
+        # query results reuse the cached instance, refreshed with the current row
+        db.execute("UPDATE foos SET name = 'changed' WHERE id = 1")
+        (loaded,) = session.models(select(Foo).where(id=1))
+        assert loaded is first
+        assert first.name == "changed"
+
+        # upsert evicts the written rows
+        session.upsert([Foo(1, "one")], update=["name"])
+        assert session.get(Foo, 1) == Foo(1, "one")
+        assert session.get(Foo, 1) is not first
+
+        # least recently used instances are evicted past max_size
+        session.models(select(Foo))
+        assert len(session) == 3
+        events.clear()
+        session.get(Foo, 4)
+        assert events == []
+        session.get(Foo, 0)
+        assert len(events) == 1
+
+        session.invalidate(Foo, 4)
+        assert len(session) == 2
+        session.invalidate(Foo)
+        assert len(session) == 0
+    finally:
+        instrument.remove_hook(events.append)
+        unregister_all_models()
+
+
+def test_session_partial_instances():
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+        name: str
+        notes: str = ""
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Foo(1, "a", "long")], update=[])
+    session = Session(db)
+
+    # partial instances aren't cached
+    (partial,) = session.models(select(Foo).only("id", "name"))
+    assert partial.notes is DEFERRED
+    assert len(session) == 0
+    cached = session.get(Foo, 1)
+    assert cached == Foo(1, "a", "long")
+
+    # but refresh the loaded fields of a cached instance, leaving the rest alone
+    db.execute("UPDATE foos SET name = 'b'")
+    (loaded,) = session.models(select(Foo).only("id", "name"))
+    assert loaded is cached
+    assert cached == Foo(1, "b", "long")
+
+    assert session.models(select(Foo).only("name")) == [Foo(DEFERRED, "b", DEFERRED)]  # pyright: ignore
+    unregister_all_models()
+
+
+def test_session_requires_primary_key_for_get():
+    @model("foos")
+    class Foo:
+        name: str
+
+    db = connect_to_sqlite(":memory:")
+    migrate(db)
+    upsert(db, [Foo("a")], update=[])
+    session = Session(db)
+
+    with pytest.raises(MissingPrimaryKeyError):
+        session.get(Foo, "a")
+
+    assert session.models(select(Foo)) == [Foo("a")]
+    assert len(session) == 0
+    unregister_all_models()
@@ -0,0 +1,54 @@
+import pytest
+import threading
+
+from ormlite import model, field, select, upsert, migrate, connect_to_sqlite, ConnectionPool
+from ormlite.sqlite import Settings
+
+from .utils import unregister_all_models
+
+
+def test_connect_with_settings(tmp_path):
+    db = connect_to_sqlite(str(tmp_path / "test.db"), Settings(busy_timeout=1234, cache_size=-100))
+    assert db.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert db.execute("PRAGMA synchronous").fetchone() == (1,)
+    assert db.execute("PRAGMA busy_timeout").fetchone() == (1234,)
+    assert db.execute("PRAGMA cache_size").fetchone() == (-100,)
+    db.close()
+
+
+def test_pool_rejects_memory_database():
+    with pytest.raises(ValueError):
+        ConnectionPool(":memory:")
+
+
+def test_pool_reads_and_writes_across_threads(tmp_path):
+    @model("foos")
+    class Foo:
+        id: int = field(pk=True)
+        name: str
+
+    pool = ConnectionPool(str(tmp_path / "test.db"))
+    # migrate runs in an exclusive transaction, so its reads must be routed to the writer
+    migrate(pool)
+    upsert(pool, [Foo(id=i, name=str(i)) for i in range(10)], update=[])
+    assert not pool.reader().in_transaction
+
+    results = {}
+
+    def read(i: int):
+        results[i] = (select(Foo).where(id=i).models(pool), pool.reader())
+
+    threads = [threading.Thread(target=read, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [results[i][0] for i in range(4)] == [[Foo(id=i, name=str(i))] for i in range(4)]
+    assert len({id(results[i][1]) for i in range(4)}) == 4
+
+    with pytest.raises(Exception, match="readonly"):
+        pool.reader().execute("DELETE FROM foos")
+
+    pool.close()
+    unregister_all_models()
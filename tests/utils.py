@@ -6,3 +6,4 @@ def unregister_all_models():
 
     Context.MODEL_TO_TABLE = dict()
     Context.TABLE_TO_MODEL = dict()
+    Context.DECODERS = dict()